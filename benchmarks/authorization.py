@@ -0,0 +1,100 @@
+"""Requests per second with and without the cached authorization path.
+
+Threads hammer cheap authenticated endpoints (central departments and
+doctors, the secretary's daily list, /api/auth/me), so that the cost of
+authorizing dominates. Each endpoint runs twice: once with the user cache
+disabled (TTL 0), which reads the user row on every request like the old
+User.query.get() role checks did, and once with the cache as configured.
+Reports requests/s, p95 latency and SQL statements per request.
+
+    python benchmarks/authorization.py --threads 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header, percentile
+
+# (label, url, who)
+ENDPOINTS = [
+    ('central departments', '/api/central/departments', 'admin'),
+    ('central doctors', '/api/central/doctors', 'admin'),
+    ('secretary visits', '/api/secretary/visits', 'secretary-1'),
+    ('auth me', '/api/auth/me', 'secretary-1'),
+]
+
+
+def run(app, url, headers, threads, seconds):
+    from sqlalchemy import event
+    from src.main import db
+
+    statements = [0]
+    latencies = []
+    lock = threading.Lock()
+
+    def count(*args):
+        statements[0] += 1
+
+    def worker():
+        client = app.test_client()
+        client.get(url, headers=headers)
+        warmed.wait()
+        go.wait()
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = client.get(url, headers=headers)
+            local.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        with lock:
+            latencies.extend(local)
+
+    with app.app_context():
+        engine = db.engine
+    # Count only the timed requests: start once every thread has warmed up
+    warmed = threading.Barrier(threads + 1)
+    go = threading.Event()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    warmed.wait()
+    event.listen(engine, 'before_cursor_execute', count)
+    deadline = time.monotonic() + seconds
+    go.set()
+    for thread in workers:
+        thread.join()
+    event.remove(engine, 'before_cursor_execute', count)
+    return len(latencies) / seconds, percentile(latencies, 0.95), statements[0] / max(len(latencies), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    app = load_app()
+    seed(app, doctors=10, patients=100)
+    headers = {who: auth_header(app, who) for who in {who for _, _, who in ENDPOINTS}}
+
+    from src.services.authorization import user_cache
+
+    configured_ttl = user_cache.ttl
+    print(f'{args.threads} threads, {args.seconds:g}s per run')
+    for label, url, who in ENDPOINTS:
+        results = []
+        for ttl in (0, configured_ttl):
+            user_cache.ttl = ttl
+            user_cache.clear()
+            results.append(run(app, url, headers[who], args.threads, args.seconds))
+        (before, before_p95, before_sql), (after, after_p95, after_sql) = results
+        print(f'{label:>20}: lookup per request {before:7.0f} req/s p95={before_p95 * 1000:5.1f}ms '
+              f'{before_sql:.1f} SQL/req | cached {after:7.0f} req/s p95={after_p95 * 1000:5.1f}ms '
+              f'{after_sql:.1f} SQL/req ({after / before:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Shared setup for the benchmark scripts.
+
+Each benchmark runs the real Flask app in-process against a scratch SQLite
+database, so it never touches src/database/app.db. The app reads its
+configuration at import time: call load_app() before importing anything
+from src.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(database_path=None, **environ):
+    """Import and initialise the app on ``database_path`` (a fresh temp file by default)"""
+    if database_path is None:
+        handle, database_path = tempfile.mkstemp(prefix='hospital-bench-', suffix='.db')
+        os.close(handle)
+        os.unlink(database_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
+    os.environ.update(environ)
+
+    sys.path.insert(0, ROOT)
+    from src.main import app, create_app
+    create_app()
+    return app
+
+
+def seed(app, doctors=10, patients=1000):
+    """Minimal reference data: one department, doctors, patients and a secretary per doctor"""
+    from src.main import db, Department, Doctor, Patient, User
+
+    with app.app_context():
+        department = Department(name='General')
+        db.session.add(department)
+        db.session.flush()
+        db.session.add_all(Doctor(name=f'Doctor {i}', department_id=department.id) for i in range(doctors))
+        db.session.add_all(
+            Patient(social_id=f'P{i:08d}', name=f'Patient {i}', age=20 + i % 60, phone=f'07{i:09d}')
+            for i in range(patients)
+        )
+        db.session.flush()
+        for doctor in Doctor.query.all():
+            user = User(username=f'secretary-{doctor.id}', role='secretary', doctor_id=doctor.id)
+            user.set_password('secretary')
+            db.session.add(user)
+        db.session.commit()
+
+
+SYLLABLES = ['a', 'al', 'ba', 'da', 'fa', 'ha', 'hu', 'ja', 'ka', 'la', 'ma', 'mu', 'na', 'ra', 'sa', 'su',
+             'ta', 'wa', 'ya', 'za', 'zi', 'di', 'mi', 'ri', 'si', 'li', 'ni', 'ki', 'dh', 'sh']
+
+
+def make_names(rng, count, syllables):
+    """Up to ``count`` distinct pronounceable names of ``syllables`` syllables"""
+    return sorted({''.join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize() for _ in range(count)})
+
+
+def auth_header(app, username):
+    from flask_jwt_extended import create_access_token
+    from src.main import User
+
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        token = create_access_token(identity=str(user.id), additional_claims={
+            'role': user.role, 'doctor_id': user.doctor_id
+        })
+    return {'Authorization': f'Bearer {token}'}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,117 @@
+"""Concurrent read/write benchmark of the SQLite storage profiles.
+
+Runs the same mix of check-ins, status updates and queue/list reads from
+several threads, once per SQLITE_PROFILE, and reports throughput and how
+many requests failed (typically with "database is locked").
+
+    python benchmarks/concurrent_rw.py --threads 16 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header, percentile
+
+DOCTORS = 10
+PATIENTS = 1000
+
+
+def run_profile(threads, seconds):
+    app = load_app()
+    seed(app, doctors=DOCTORS, patients=PATIENTS)
+    admin = auth_header(app, 'admin')
+    secretaries = [auth_header(app, f'secretary-{i}') for i in range(1, DOCTORS + 1)]
+
+    results = Counter()
+    errors = Counter()
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        secretary = secretaries[index % DOCTORS]
+        writer = index % 2 == 0
+        created = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            if writer and (not created or rng.random() < 0.6):
+                kind = 'write'
+                response = client.post('/api/secretary/visits', headers=secretary,
+                                       json={'patient_id': rng.randint(1, PATIENTS)})
+                if response.status_code == 201:
+                    created.append(response.get_json()['id'])
+            elif writer:
+                kind = 'write'
+                response = client.put(f'/api/secretary/visits/{rng.choice(created)}', headers=secretary,
+                                      json={'status': rng.choice(['in_progress', 'completed'])})
+            else:
+                kind = 'read'
+                choice = rng.random()
+                if choice < 0.5:
+                    response = client.get(f'/api/patient/queue?phone=07{rng.randint(0, PATIENTS - 1):09d}')
+                elif choice < 0.8:
+                    response = client.get('/api/secretary/visits', headers=secretary)
+                else:
+                    response = client.get('/api/central/visits?limit=100', headers=admin)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 500:
+                    errors[(response.get_json() or {}).get('error', '')[:60]] += 1
+                    results[f'{kind}_errors'] += 1
+                else:
+                    results[kind] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return {
+        'profile': os.environ.get('SQLITE_PROFILE', 'tuned'),
+        'writes_per_sec': round(results['write'] / seconds, 1),
+        'reads_per_sec': round(results['read'] / seconds, 1),
+        'write_errors': results['write_errors'],
+        'read_errors': results['read_errors'],
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'top_errors': errors.most_common(3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', default='default,tuned')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_profile(args.threads, args.seconds)))
+        return
+
+    # Configuration is read at import, so each profile runs in its own process
+    for profile in args.profiles.split(','):
+        output = subprocess.run(
+            [sys.executable, __file__, '--single', '--threads', str(args.threads), '--seconds', str(args.seconds)],
+            env={**os.environ, 'SQLITE_PROFILE': profile}, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['profile']:>8}: {result['writes_per_sec']:>8} writes/s {result['reads_per_sec']:>8} reads/s "
+              f"errors w={result['write_errors']} r={result['read_errors']} p95={result['p95_ms']}ms")
+        for message, count in result['top_errors']:
+            print(f"          {count} x {message}")
+
+
+if __name__ == '__main__':
+    main()
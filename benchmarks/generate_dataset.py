@@ -0,0 +1,175 @@
+"""Synthetic hospital dataset for load tests.
+
+Fills a database with departments, doctors (each with a secretary account
+``secretary-<doctor id>`` / ``secretary``), patients and visits spread over
+the last ``--days`` days. Past visits are completed or cancelled; today's
+queues are part served, part waiting. The same --seed always produces the
+same data.
+
+    python benchmarks/generate_dataset.py --doctors 300 --patients 1000000 --visits 3000000
+
+Writes to src/database/app.db unless --database is given, and refuses to
+touch a database that already has patients.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, load_app, make_names
+
+DEPARTMENTS = ['Cardiology', 'Dermatology', 'Emergency', 'ENT', 'Gastroenterology', 'General Medicine',
+               'Gynecology', 'Neurology', 'Ophthalmology', 'Orthopedics', 'Pediatrics', 'Psychiatry',
+               'Pulmonology', 'Radiology', 'Urology']
+COMPLAINTS = ['Follow-up', 'Chest pain', 'Headache', 'Fever', 'Back pain', 'Check-up', 'Rash', 'Cough',
+              'Lab results', 'Prescription renewal', None, None]
+SECRETARY_PASSWORD = 'secretary'
+CANCELLED_RATE = 0.12
+RATED_RATE = 0.4
+
+
+def generate(app, departments=12, doctors=300, patients=1000000, visits=3000000, days=365, seed=42, log=print):
+    """Insert the dataset into the app's (empty) database; returns the row counts"""
+    from src.main import db, Patient, User, password_hasher
+    from src.services import doctor_stats
+
+    rng = random.Random(seed)
+    with app.app_context():
+        if Patient.query.first():
+            raise SystemExit('The database already has patients; point --database at a new file')
+
+        connection = db.engine.raw_connection()
+        # Bulk load: durability of a half-written dataset does not matter
+        connection.execute('PRAGMA synchronous = OFF')
+
+        started = time.perf_counter()
+        connection.executemany(
+            'INSERT INTO department (name, description, created_at, updated_at) VALUES (?, ?, ?, ?)',
+            [(name, f'{name} department', _now(), _now()) for name in DEPARTMENTS[:departments]]
+        )
+        department_ids = [row[0] for row in connection.execute('SELECT id FROM department ORDER BY id')]
+        department_names = dict(connection.execute('SELECT id, name FROM department'))
+
+        first_names = make_names(rng, 3000, 3)
+        last_names = make_names(rng, 8000, 4)
+        connection.executemany(
+            'INSERT INTO doctor (name, department_id, specialization, is_active, can_assign_patients, '
+            'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(f'Dr. {rng.choice(first_names)} {rng.choice(last_names)}', department_id, department_names[department_id],
+              True, rng.random() > 0.02, _now(), _now())
+             for department_id in (rng.choice(department_ids) for _ in range(doctors))]
+        )
+        doctor_ids = [row[0] for row in connection.execute('SELECT id FROM doctor ORDER BY id')]
+
+        # One hash for every secretary: bcrypt at production cost is slow
+        password_hash = password_hasher.hash(SECRETARY_PASSWORD)
+        connection.executemany(
+            'INSERT INTO user (username, password_hash, role, doctor_id, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(f'secretary-{doctor_id}', password_hash, 'secretary', doctor_id, _now(), _now())
+             for doctor_id in doctor_ids]
+        )
+        connection.commit()
+
+        for offset in range(0, patients, 50000):
+            connection.executemany(
+                'INSERT INTO patient (social_id, name, age, phone, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(f'S{i:011d}', f'{rng.choice(first_names)} {rng.choice(first_names)} {rng.choice(last_names)}',
+                  rng.randint(0, 95), f'07{i:09d}', _now(), _now())
+                 for i in range(offset, min(patients, offset + 50000))]
+            )
+            connection.commit()
+        log(f'{patients} patients in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        _insert_visits(connection, rng, doctor_ids, patients, visits, days)
+        connection.close()
+        log(f'{visits} visits in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        doctor_stats.rebuild()
+        log(f'Daily stats rebuilt in {time.perf_counter() - started:.1f}s')
+
+        return {
+            'departments': len(department_ids),
+            'doctors': len(doctor_ids),
+            'patients': patients,
+            'visits': visits,
+            'users': User.query.count(),
+        }
+
+
+def _insert_visits(connection, rng, doctor_ids, patients, visits, days):
+    today = date.today()
+    # Some doctors are far busier than others
+    popularity = [rng.paretovariate(2.5) for _ in doctor_ids]
+    per_day = visits // days
+    remainder = visits - per_day * days
+
+    for day_index in range(days):
+        visit_date = today - timedelta(days=days - 1 - day_index)
+        count = per_day + (remainder if day_index == days - 1 else 0)
+        by_doctor = Counter(rng.choices(doctor_ids, weights=popularity, k=count))
+
+        rows = []
+        for doctor_id, doctor_visits in sorted(by_doctor.items()):
+            served_today = int(doctor_visits * rng.uniform(0.3, 0.7))
+            arrival = datetime.combine(visit_date, datetime.min.time()) + timedelta(hours=7, minutes=30)
+            for queue_number in range(1, doctor_visits + 1):
+                arrival += timedelta(minutes=rng.expovariate(1 / 12))
+                if visit_date < today:
+                    status = 'cancelled' if rng.random() < CANCELLED_RATE else 'completed'
+                elif queue_number <= served_today:
+                    status = 'completed'
+                elif queue_number == served_today + 1:
+                    status = 'in_progress'
+                else:
+                    status = 'waiting'
+                completed_at = arrival + timedelta(minutes=rng.uniform(10, 150)) if status == 'completed' else None
+                rated = completed_at is not None and rng.random() < RATED_RATE
+                rows.append((
+                    rng.randrange(1, patients + 1), doctor_id, queue_number, status, rng.choice(COMPLAINTS),
+                    visit_date.isoformat(), _timestamp(completed_at),
+                    rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 8, 10])[0] if rated else None,
+                    'Very helpful' if rated and rng.random() < 0.2 else None, None,
+                    _timestamp(arrival), _timestamp(completed_at or arrival)
+                ))
+        connection.executemany(
+            'INSERT INTO visit (patient_id, doctor_id, queue_number, status, description, visit_date, completed_at, '
+            'rating, patient_notes, admin_notes, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        connection.commit()
+
+
+def _timestamp(value):
+    return value.isoformat(sep=' ') if value else None
+
+
+def _now():
+    return _timestamp(datetime.utcnow())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=os.path.join(ROOT, 'src', 'database', 'app.db'))
+    parser.add_argument('--departments', type=int, default=12)
+    parser.add_argument('--doctors', type=int, default=300)
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--visits', type=int, default=3000000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12, help='cost of the secretary password hash')
+    args = parser.parse_args()
+
+    app = load_app(os.path.abspath(args.database), BCRYPT_ROUNDS=str(args.bcrypt_rounds))
+    counts = generate(app, args.departments, args.doctors, args.patients, args.visits, args.days, args.seed)
+    print(', '.join(f'{count} {name}' for name, count in counts.items()) + f' in {args.database}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Update throughput with and without group commit.
+
+Threads rate completed visits (PUT /api/patient/visits/<id>/rating) and
+move visits along (PUT /api/secretary/visits/<id>), once with every
+request committing on its own and once with GROUP_COMMIT=1, and report
+updates per second, p50/p95 latency and failures.
+
+    python benchmarks/group_commit.py --threads 32 --seconds 10
+    python benchmarks/group_commit.py --profile default   # rollback journal, fsync per commit
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header, percentile
+
+DOCTORS = 10
+PATIENTS = 1000
+VISITS_PER_DOCTOR = 200
+
+
+def seed_visits(app):
+    from src.main import db, Visit
+
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all(
+            Visit(patient_id=1 + (doctor_id * VISITS_PER_DOCTOR + number) % PATIENTS, doctor_id=doctor_id,
+                  queue_number=number, visit_date=date.today(), status='completed', completed_at=now)
+            for doctor_id in range(1, DOCTORS + 1) for number in range(1, VISITS_PER_DOCTOR + 1)
+        )
+        db.session.commit()
+        return {doctor_id: [visit_id for visit_id, in db.session.query(Visit.id).filter_by(doctor_id=doctor_id)]
+                for doctor_id in range(1, DOCTORS + 1)}
+
+
+def run_mode(threads, seconds):
+    app = load_app()
+    seed(app, doctors=DOCTORS, patients=PATIENTS)
+    visits = seed_visits(app)
+    secretaries = {doctor_id: auth_header(app, f'secretary-{doctor_id}') for doctor_id in visits}
+
+    results = Counter()
+    errors = Counter()
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        doctor_id = 1 + index % DOCTORS
+        while time.monotonic() < deadline:
+            visit_id = rng.choice(visits[doctor_id])
+            started = time.perf_counter()
+            if rng.random() < 0.5:
+                response = client.put(f'/api/patient/visits/{visit_id}/rating',
+                                      json={'rating': rng.randint(1, 5), 'patient_notes': 'Benchmark'})
+            else:
+                # Completed visits stay completed; the description changes
+                response = client.put(f'/api/secretary/visits/{visit_id}', headers=secretaries[doctor_id],
+                                      json={'description': f'Update {rng.random():.6f}'})
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code == 200:
+                    results['ok'] += 1
+                else:
+                    results['failed'] += 1
+                    errors[f"{response.status_code} {(response.get_json() or {}).get('error', '')[:60]}"] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return {
+        'group_commit': os.environ.get('GROUP_COMMIT') == '1',
+        'updates_per_sec': round(results['ok'] / seconds, 1),
+        'failed': results['failed'],
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'top_errors': errors.most_common(3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', default=os.environ.get('SQLITE_PROFILE', 'tuned'), help='SQLITE_PROFILE to run with')
+    parser.add_argument('--max-delay-ms', default='2', help='GROUP_COMMIT_MAX_DELAY_MS for the group commit run')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_mode(args.threads, args.seconds)))
+        return
+
+    # Configuration is read at import, so each mode runs in its own process
+    for enabled in ('0', '1'):
+        environ = {**os.environ, 'SQLITE_PROFILE': args.profile, 'GROUP_COMMIT': enabled,
+                   'GROUP_COMMIT_MAX_DELAY_MS': args.max_delay_ms}
+        output = subprocess.run(
+            [sys.executable, __file__, '--single', '--threads', str(args.threads), '--seconds', str(args.seconds)],
+            env=environ, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        label = 'group commit' if result['group_commit'] else 'per request'
+        print(f"{label:>12}: {result['updates_per_sec']:>8} updates/s p50={result['p50_ms']}ms "
+              f"p95={result['p95_ms']}ms failed={result['failed']}")
+        for message, count in result['top_errors']:
+            print(f"              {count} x {message}")
+
+
+if __name__ == '__main__':
+    main()
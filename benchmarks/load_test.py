@@ -0,0 +1,275 @@
+"""Load test replaying a realistic traffic mix, with a baseline regression gate.
+
+Threads issue a weighted mix of what the hospital actually does all day:
+patients polling their queue position, secretaries listing and checking in
+visits and moving them along, the central dashboard refreshing, and logins.
+Throughput and p50/p95/p99 latency are reported per endpoint.
+
+In-process (Flask test client) against a generated dataset:
+
+    python benchmarks/generate_dataset.py --database /tmp/hospital.db
+    python benchmarks/load_test.py --database /tmp/hospital.db --threads 16 --seconds 30
+
+Against a running server seeded with generate_dataset.py:
+
+    python benchmarks/load_test.py --url http://127.0.0.1:5000
+
+Without --database or --url a small dataset is generated in a temp file.
+--save-baseline stores the results; --baseline compares against them and
+exits with status 1 when an endpoint's p95 grew or its throughput fell by
+more than --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, percentile
+
+# (scenario, weight); weights are relative
+DEFAULT_MIX = [
+    ('patient_queue', 45),
+    ('secretary_list', 15),
+    ('secretary_check_in', 10),
+    ('secretary_advance', 10),
+    ('patient_history', 5),
+    ('central_dashboard', 10),
+    ('login', 5),
+]
+SAMPLE_PATIENTS = 1000
+
+
+class TestClientTransport:
+    """Requests through Flask's test client, in this process"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        client = self.app.test_client()
+
+        def request(method, path, headers=None, body=None):
+            response = client.open(path, method=method, headers=headers, json=body)
+            return response.status_code, response.get_json(silent=True)
+        return request
+
+
+class HttpTransport:
+    """Requests over HTTP to a running server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def client(self):
+        def request(method, path, headers=None, body=None):
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            headers = dict(headers or {})
+            if data is not None:
+                headers['Content-Type'] = 'application/json'
+            http_request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+            try:
+                with urllib.request.urlopen(http_request, timeout=30) as response:
+                    status, payload = response.status, response.read()
+            except urllib.error.HTTPError as error:
+                status, payload = error.code, error.read()
+            try:
+                return status, json.loads(payload) if payload else None
+            except ValueError:
+                return status, None
+        return request
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def timed(self, request, label, method, path, headers=None, body=None):
+        started = time.perf_counter()
+        status, payload = request(method, path, headers, body)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            if status >= 500:
+                self.errors[label] += 1
+        return status, payload
+
+
+def login(request, username, password):
+    status, payload = request('POST', '/api/auth/login', body={'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Login as {username} failed ({status}): {payload}')
+    return {'Authorization': f"Bearer {payload['access_token']}"}
+
+
+def prepare(transport, threads, admin_password):
+    """Tokens and sample ids the scenarios draw from, fetched through the API"""
+    request = transport.client()
+    admin = login(request, 'admin', admin_password)
+    _, doctors = request('GET', '/api/central/doctors', admin)
+    _, page = request('GET', f'/api/central/patients?limit={SAMPLE_PATIENTS}', admin)
+    if not doctors or not page or not page['items']:
+        raise SystemExit('The dataset needs doctors and patients; run generate_dataset.py first')
+
+    # One secretary per thread, for doctors that may take patients
+    assignable = [doctor['id'] for doctor in doctors if doctor.get('can_assign_patients', True)]
+    secretaries = []
+    for doctor_id in assignable[:threads]:
+        secretaries.append((f'secretary-{doctor_id}', login(request, f'secretary-{doctor_id}', 'secretary')))
+    return {
+        'admin': admin,
+        'secretaries': secretaries,
+        'patients': [(patient['id'], patient['phone']) for patient in page['items']],
+    }
+
+
+def run_worker(index, transport, context, recorder, mix, deadline):
+    request = transport.client()
+    rng = random.Random(index)
+    username, secretary = context['secretaries'][index % len(context['secretaries'])]
+    admin = context['admin']
+    scenarios = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    while time.monotonic() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        patient_id, phone = rng.choice(context['patients'])
+        if scenario == 'patient_queue':
+            recorder.timed(request, 'GET /api/patient/queue', 'GET', f'/api/patient/queue?phone={phone}')
+        elif scenario == 'secretary_list':
+            recorder.timed(request, 'GET /api/secretary/visits', 'GET', '/api/secretary/visits', secretary)
+        elif scenario == 'secretary_check_in':
+            recorder.timed(request, 'POST /api/secretary/visits', 'POST', '/api/secretary/visits', secretary,
+                           {'patient_id': patient_id, 'description': 'Load test'})
+        elif scenario == 'secretary_advance':
+            # Finish the patient being seen and call in the next one
+            recorder.timed(request, 'POST /api/secretary/visits/advance', 'POST', '/api/secretary/visits/advance',
+                           secretary)
+        elif scenario == 'patient_history':
+            recorder.timed(request, 'GET /api/patient/visits/<id>', 'GET', f'/api/patient/visits/{patient_id}?limit=20')
+        elif scenario == 'central_dashboard':
+            recorder.timed(request, 'GET /api/central/visits/stats', 'GET', '/api/central/visits/stats', admin)
+            recorder.timed(request, 'GET /api/central/doctors', 'GET', '/api/central/doctors', admin)
+            recorder.timed(request, 'GET /api/central/visits', 'GET', '/api/central/visits?limit=100', admin)
+        elif scenario == 'login':
+            recorder.timed(request, 'POST /api/auth/login', 'POST', '/api/auth/login',
+                           body={'username': username, 'password': 'secretary'})
+
+
+def summarize(recorder, seconds):
+    results = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        results[label] = {
+            'requests': len(latencies),
+            'throughput': round(len(latencies) / seconds, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'errors': recorder.errors.get(label, 0),
+        }
+    return results
+
+
+def print_results(results, seconds):
+    total = sum(result['requests'] for result in results.values())
+    print(f"{'endpoint':<34} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for label, result in results.items():
+        print(f"{label:<34} {result['throughput']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['errors']:>7}")
+    print(f"{'total':<34} {round(total / seconds, 2):>9}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline`` as printable lines"""
+    regressions = []
+    for label, base in baseline['endpoints'].items():
+        current = results.get(label)
+        if current is None:
+            regressions.append(f'{label}: not exercised in this run')
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {base['throughput']}/s -> {current['throughput']}/s")
+        if current['errors'] > base.get('errors', 0):
+            regressions.append(f"{label}: {current['errors']} server errors (baseline {base.get('errors', 0)})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--database', help='generated SQLite database to run in-process against')
+    target.add_argument('--url', help='base URL of a running server')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=2, help='seconds of traffic before measuring')
+    parser.add_argument('--mix', help='comma separated scenario=weight pairs overriding the default mix')
+    parser.add_argument('--admin-password', default='admin123')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--baseline', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+    args = parser.parse_args()
+
+    mix = DEFAULT_MIX
+    if args.mix:
+        mix = [(name, float(weight)) for name, weight in (pair.split('=') for pair in args.mix.split(','))]
+        unknown = {name for name, _ in mix} - {name for name, _ in DEFAULT_MIX}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        transport = HttpTransport(args.url)
+    elif args.database:
+        transport = TestClientTransport(load_app(os.path.abspath(args.database)))
+    else:
+        from generate_dataset import generate
+        app = load_app()
+        generate(app, doctors=20, patients=20000, visits=100000, days=90, log=lambda message: None)
+        transport = TestClientTransport(app)
+
+    context = prepare(transport, args.threads, args.admin_password)
+
+    for phase, seconds in (('warmup', args.warmup), ('measure', args.seconds)):
+        if seconds <= 0:
+            continue
+        recorder = Recorder()
+        deadline = time.monotonic() + seconds
+        workers = [
+            threading.Thread(target=run_worker, args=(i, transport, context, recorder, mix, deadline))
+            for i in range(args.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    results = summarize(recorder, args.seconds)
+    print_results(results, args.seconds)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as handle:
+            json.dump({'threads': args.threads, 'seconds': args.seconds, 'endpoints': results}, handle, indent=2)
+        print(f'Baseline saved to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            raise SystemExit(1)
+        print(f'No regressions beyond {args.tolerance:.0%} of {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
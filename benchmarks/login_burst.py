@@ -0,0 +1,100 @@
+"""Mixed login and queue traffic: bcrypt inline versus on the bounded pool.
+
+Login threads sign secretaries in back to back (a shift change) while
+queue threads poll /api/patient/queue. Runs twice: once verifying
+passwords on the request thread, as User.check_password used to, and once
+on the PasswordHasher pool. Reports queue requests/s and p95, logins/s and
+p95, and logins turned away with 503.
+
+    python benchmarks/login_burst.py --login-threads 16 --queue-threads 8 --rounds 12
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, percentile
+
+DOCTORS = 10
+PATIENTS = 1000
+
+
+def seed_queue(app):
+    from src.main import db, Visit
+
+    with app.app_context():
+        db.session.add_all(
+            Visit(patient_id=patient_id, doctor_id=1 + patient_id % DOCTORS, queue_number=1 + patient_id // DOCTORS,
+                  visit_date=date.today())
+            for patient_id in range(1, PATIENTS + 1)
+        )
+        db.session.commit()
+
+
+def run(app, login_threads, queue_threads, seconds):
+    latencies = {'login': [], 'queue': []}
+    outcomes = Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(index, kind):
+        client = app.test_client()
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            if kind == 'login':
+                response = client.post('/api/auth/login', json={
+                    'username': f'secretary-{1 + index % DOCTORS}', 'password': 'secretary'
+                })
+            else:
+                response = client.get(f'/api/patient/queue?phone=07{(index * 37 + len(local)) % PATIENTS:09d}')
+            local.append(time.perf_counter() - started)
+            with lock:
+                outcomes[f'{kind} {response.status_code}'] += 1
+        with lock:
+            latencies[kind].extend(local)
+
+    workers = [threading.Thread(target=worker, args=(i, 'login')) for i in range(login_threads)]
+    workers += [threading.Thread(target=worker, args=(i, 'queue')) for i in range(queue_threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--queue-threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor of the secretary passwords')
+    args = parser.parse_args()
+
+    app = load_app(BCRYPT_ROUNDS=str(args.rounds))
+    seed(app, doctors=DOCTORS, patients=PATIENTS)
+    seed_queue(app)
+
+    from src.services.password_hashing import password_hasher
+
+    pooled = password_hasher.verify
+    print(f'{args.login_threads} login threads, {args.queue_threads} queue threads, cost {args.rounds}, '
+          f'{args.seconds:g}s per mode, {os.cpu_count()} CPUs')
+    for mode in ('inline', 'pool'):
+        # Inline: the old path, bcrypt on the request thread with no admission limit
+        password_hasher.verify = password_hasher._verify if mode == 'inline' else pooled
+        latencies, outcomes = run(app, args.login_threads, args.queue_threads, args.seconds)
+        queue, login = latencies['queue'], latencies['login']
+        print(f"{mode:>7}: queue {outcomes['queue 200'] / args.seconds:7.0f} req/s "
+              f"p95={percentile(queue, 0.95) * 1000:6.1f}ms | "
+              f"login {outcomes['login 200'] / args.seconds:5.1f}/s p95={percentile(login, 0.95) * 1000:6.0f}ms "
+              f"503={outcomes['login 503']}")
+    password_hasher.verify = pooled
+
+
+if __name__ == '__main__':
+    main()
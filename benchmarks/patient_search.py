@@ -0,0 +1,79 @@
+"""Patient name lookup: leading-wildcard ILIKE versus the FTS5 name index.
+
+Fills a scratch database with a synthetic registry and times the same
+name lookups both ways.
+
+    python benchmarks/patient_search.py --patients 1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, make_names, percentile
+
+
+def fill_registry(app, count, rng, first_names, last_names):
+    from src.main import db
+
+    rows = (
+        (f'B{i:010d}', f'{rng.choice(first_names)} {rng.choice(first_names)} {rng.choice(last_names)}',
+         rng.randint(1, 90), f'07{i:09d}')
+        for i in range(count)
+    )
+    with app.app_context():
+        # Bypass the ORM: this measures lookups, not inserts. The FTS triggers
+        # still fire for every row.
+        connection = db.engine.raw_connection()
+        connection.executemany('INSERT INTO patient (social_id, name, age, phone) VALUES (?, ?, ?, ?)', rows)
+        connection.commit()
+        connection.close()
+
+
+def time_lookups(label, lookup, queries):
+    latencies = []
+    found = 0
+    for query in queries:
+        started = time.perf_counter()
+        found += len(lookup(query))
+        latencies.append(time.perf_counter() - started)
+    print(f'{label:>6}: p50={percentile(latencies, 0.5) * 1000:8.2f}ms p95={percentile(latencies, 0.95) * 1000:8.2f}ms '
+          f'avg results={found / len(queries):.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    first_names = make_names(rng, 3000, 3)
+    last_names = make_names(rng, 8000, 4)
+    app = load_app()
+    started = time.perf_counter()
+    fill_registry(app, args.patients, rng, first_names, last_names)
+    print(f'Loaded {args.patients} patients in {time.perf_counter() - started:.1f}s')
+
+    from src.models.patient import Patient
+    from src.services.patient_search import search_by_name
+
+    # What the reception desk types: a first name, a first name and the start
+    # of the family name, or a family name
+    queries = [rng.choice([
+        lambda: rng.choice(first_names),
+        lambda: f'{rng.choice(first_names)} {rng.choice(last_names)[:4]}',
+        lambda: rng.choice(last_names),
+    ])() for _ in range(args.queries)]
+
+    with app.app_context():
+        time_lookups('ilike', lambda name: Patient.query.filter(Patient.name.ilike(f'%{name}%'))
+                     .limit(args.limit).all(), queries)
+        time_lookups('fts5', lambda name: search_by_name(name, limit=args.limit), queries)
+
+
+if __name__ == '__main__':
+    main()
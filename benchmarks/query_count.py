@@ -0,0 +1,102 @@
+"""Check that visit list endpoints run a fixed number of SQL statements.
+
+Counts the statements each visit list endpoint executes with one visit
+and again with --visits visits, through a before_cursor_execute listener
+on the engine. Every request is made once beforehand so that caches are
+warm for both counts. Exits with status 1 when a count grows with the
+number of rows (an N+1 query), or when the http_request_sql_queries
+metric recorded for a request (see /metrics) differs from the count, as it
+would for a streamed format=ndjson list recorded before its body ran.
+
+    python benchmarks/query_count.py --visits 200
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header
+
+# (label, url, who); patient 1 and doctor 1's secretary own every visit
+ENDPOINTS = [
+    ('central visits', '/api/central/visits', 'admin'),
+    ('central visits (paged)', '/api/central/visits?limit=1000', 'admin'),
+    ('central visits (ndjson)', '/api/central/visits?format=ndjson', 'admin'),
+    ('secretary visits', '/api/secretary/visits', 'secretary-1'),
+    ('secretary history', '/api/secretary/patients/search?social_id=P00000000', 'secretary-1'),
+    ('patient history', '/api/patient/visits/1', None),
+]
+
+
+def add_visits(app, first, last):
+    from src.main import db, Visit
+
+    with app.app_context():
+        db.session.add_all(
+            Visit(patient_id=1, doctor_id=1, queue_number=number, visit_date=date.today())
+            for number in range(first, last + 1)
+        )
+        db.session.commit()
+
+
+def recorded_queries():
+    """Total of http_request_sql_queries over every endpoint"""
+    from src.services import metrics
+
+    return sum(float(line.split()[-1]) for line in metrics.request_queries.render()
+               if line.startswith('http_request_sql_queries_sum'))
+
+
+def count_statements(app, client, url, headers):
+    """Statements executed by the request, and those its metrics recorded"""
+    from sqlalchemy import event
+    from src.main import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    client.get(url, headers=headers)
+    before = recorded_queries()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+        # Streamed bodies run their queries as they are read
+        body = response.get_data(as_text=True)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, body
+    return len(statements), int(recorded_queries() - before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=200)
+    args = parser.parse_args()
+
+    app = load_app()
+    seed(app, doctors=2, patients=10)
+    client = app.test_client()
+    headers = {who: auth_header(app, who) for who in {who for _, _, who in ENDPOINTS if who}}
+
+    add_visits(app, 1, 1)
+    single = {label: count_statements(app, client, url, headers.get(who, {})) for label, url, who in ENDPOINTS}
+    add_visits(app, 2, args.visits)
+    many = {label: count_statements(app, client, url, headers.get(who, {})) for label, url, who in ENDPOINTS}
+
+    failed = False
+    for label, _, _ in ENDPOINTS:
+        (single_count, single_recorded), (many_count, many_recorded) = single[label], many[label]
+        ok = single_count == many_count and single_recorded == single_count and many_recorded == many_count
+        failed = failed or not ok
+        print(f"{'ok' if ok else 'FAIL':4} {label:>23}: {single_count} statements for 1 visit, "
+              f"{many_count} for {args.visits} (metrics recorded {single_recorded} and {many_recorded})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Stress test of queue number allocation under concurrent check-ins.
+
+Threads create visits in parallel for a few doctors through both the
+secretary and the central endpoint, then every doctor's queue numbers for
+the day are checked to be unique and gap-free (1..n). Exits with status 1
+when they are not. Failed requests (e.g. "database is locked") are
+reported but allowed: a failed check-in must not leave a gap either.
+
+    python benchmarks/queue_numbers.py --threads 32 --visits 5000
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header
+
+DOCTORS = 4
+PATIENTS = 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--visits', type=int, default=5000, help='check-ins attempted in total')
+    args = parser.parse_args()
+
+    app = load_app()
+    seed(app, doctors=DOCTORS, patients=PATIENTS)
+    admin = auth_header(app, 'admin')
+    secretaries = {doctor_id: auth_header(app, f'secretary-{doctor_id}') for doctor_id in range(1, DOCTORS + 1)}
+
+    results = Counter()
+    errors = Counter()
+    lock = threading.Lock()
+    remaining = [args.visits]
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            doctor_id = rng.randint(1, DOCTORS)
+            patient_id = rng.randint(1, PATIENTS)
+            if index % 2:
+                response = client.post('/api/secretary/visits', headers=secretaries[doctor_id],
+                                       json={'patient_id': patient_id})
+            else:
+                response = client.post('/api/central/visits', headers=admin,
+                                       json={'patient_id': patient_id, 'doctor_id': doctor_id})
+            with lock:
+                if response.status_code == 201:
+                    results['created'] += 1
+                else:
+                    results['failed'] += 1
+                    errors[f"{response.status_code} {(response.get_json() or {}).get('error', '')[:60]}"] += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    from src.main import db, Visit
+
+    with app.app_context():
+        numbers = defaultdict(list)
+        for doctor_id, queue_number in db.session.query(Visit.doctor_id, Visit.queue_number).filter(
+            Visit.visit_date == date.today()
+        ):
+            numbers[doctor_id].append(queue_number)
+
+    print(f"{results['created']} visits created, {results['failed']} failed, "
+          f"{args.threads} threads, {results['created'] / elapsed:.0f} check-ins/s")
+    for message, count in errors.most_common(3):
+        print(f'  {count} x {message}')
+
+    failed = sum(map(len, numbers.values())) != results['created']
+    for doctor_id in sorted(numbers):
+        issued = sorted(numbers[doctor_id])
+        duplicates = len(issued) - len(set(issued))
+        gaps = len(set(range(1, len(issued) + 1)) - set(issued))
+        ok = not duplicates and not gaps
+        failed = failed or not ok
+        print(f"{'ok' if ok else 'FAIL':4} doctor {doctor_id}: {len(issued)} visits, "
+              f"{duplicates} duplicate numbers, {gaps} gaps")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
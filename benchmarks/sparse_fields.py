@@ -0,0 +1,81 @@
+"""Payload size and latency of list endpoints with and without ?fields=.
+
+Fills a scratch database with visits, then requests each list through the
+real app twice: with every field, and with the handful a queue screen or
+picker actually shows. Reports the median latency and the body size.
+
+    python benchmarks/sparse_fields.py --visits 100000 --repeat 15
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header
+from visit_serialization import fill_visits
+
+TODAY_VISITS = 300
+
+# (label, url, who, fields)
+CASES = [
+    ('central visits', '/api/central/visits?limit=1000', 'admin', 'queue_number,status,patient_name,visit_date'),
+    ('central patients', '/api/central/patients?limit=1000', 'admin', 'name,phone'),
+    ('central doctors', '/api/central/doctors?is_active=true', 'admin', 'name'),
+    ('secretary queue', '/api/secretary/visits', 'secretary-1', 'queue_number,status,patient_name'),
+    ('patient history', '/api/patient/visits/1?limit=100', None, 'visit_date,status,doctor_name'),
+]
+
+
+def fill_today(app):
+    from src.main import db, Visit
+
+    with app.app_context():
+        db.session.add_all(
+            Visit(patient_id=1 + number, doctor_id=1, queue_number=number, visit_date=date.today(),
+                  description='Walk-in', admin_notes='Checked insurance')
+            for number in range(1, TODAY_VISITS + 1)
+        )
+        db.session.commit()
+
+
+def measure(client, url, headers, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return statistics.median(timings), len(response.get_data())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+
+    app = load_app()
+    seed(app, doctors=10, patients=1000)
+    fill_visits(app, args.visits, random.Random(42))
+    fill_today(app)
+
+    client = app.test_client()
+    headers = {who: auth_header(app, who) for who in {who for _, _, who, _ in CASES if who}}
+
+    print(f'{args.visits} visits, median of {args.repeat} requests')
+    for label, url, who, fields in CASES:
+        headers_for = headers.get(who, {})
+        separator = '&' if '?' in url else '?'
+        full_seconds, full_size = measure(client, url, headers_for, args.repeat)
+        sparse_seconds, sparse_size = measure(client, f'{url}{separator}fields={fields}', headers_for, args.repeat)
+        print(f'{label:>17}: all fields {full_seconds * 1000:6.1f}ms {full_size / 1e3:7.1f}kB | '
+              f'fields={fields} {sparse_seconds * 1000:6.1f}ms {sparse_size / 1e3:7.1f}kB '
+              f'({full_size / sparse_size:.1f}x smaller, {full_seconds / sparse_seconds:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
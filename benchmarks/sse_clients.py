@@ -0,0 +1,191 @@
+"""Many connected server-sent event clients: memory and fan-out latency.
+
+Opens --clients idle streams on an in-process app, half on doctor queues
+(/api/patient/queue/doctors/<id>/stream) and half on single visit
+positions (/api/patient/queue/stream?visit_id=). It then moves one visit
+per round into the consulting room and measures how long every subscriber
+of that doctor takes to receive the change. The updates come from this
+process (published by the commit hook) and then from a separate writer
+process on the same database, the way another gunicorn worker would make
+them (published by the change log feed).
+
+Reports the resident memory per connected client and delivery latency
+percentiles per path, and exits with status 1 if a subscriber missed an
+update.
+
+    python benchmarks/sse_clients.py --clients 2000 --rounds 10
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed, auth_header, percentile
+
+DOCTORS = 10
+VISITS_PER_DOCTOR = 60
+EVENT = re.compile(r'^event: (\w+)$', re.MULTILINE)
+
+
+def resident_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def seed_queues(app):
+    """Today's waiting visits; returns {doctor_id: visit ids in queue order}"""
+    from datetime import date
+    from src.main import db, Visit
+
+    with app.app_context():
+        db.session.add_all(
+            Visit(patient_id=1 + (doctor_id * VISITS_PER_DOCTOR + number) % 1000, doctor_id=doctor_id,
+                  queue_number=number, visit_date=date.today())
+            for doctor_id in range(1, DOCTORS + 1) for number in range(1, VISITS_PER_DOCTOR + 1)
+        )
+        db.session.commit()
+        queues = defaultdict(list)
+        for visit_id, doctor_id in db.session.query(Visit.id, Visit.doctor_id).order_by(Visit.queue_number):
+            queues[doctor_id].append(visit_id)
+        return queues
+
+
+def run_writer(database_path):
+    """Remote writer: move the visits read from stdin along, printing when each started"""
+    app = load_app(database_path)
+    client = app.test_client()
+    secretaries = {}
+    for line in sys.stdin:
+        visit_id, doctor_id = map(int, line.split())
+        if doctor_id not in secretaries:
+            secretaries[doctor_id] = auth_header(app, f'secretary-{doctor_id}')
+        started = time.time()
+        response = client.put(f'/api/secretary/visits/{visit_id}', headers=secretaries[doctor_id],
+                              json={'status': 'in_progress'})
+        print(started, response.status_code, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=10, help='updates per path')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between updates')
+    parser.add_argument('--writer', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer:
+        run_writer(args.writer)
+        return
+
+    handle, database_path = tempfile.mkstemp(prefix='hospital-bench-', suffix='.db')
+    os.close(handle)
+    os.unlink(database_path)
+    app = load_app(database_path, WEB_STREAMS=str(args.clients))
+    seed(app, doctors=DOCTORS, patients=1000)
+    queues = seed_queues(app)
+    if 2 * args.rounds > DOCTORS * VISITS_PER_DOCTOR // 2:
+        parser.error('too many rounds for the seeded queues')
+
+    # Visit streams watch the back half of each queue, which stays waiting
+    subscribers = []    # (url, doctor_id)
+    for index in range(args.clients):
+        doctor_id = 1 + index % DOCTORS
+        if index % 2:
+            subscribers.append((f'/api/patient/queue/doctors/{doctor_id}/stream', doctor_id))
+        else:
+            queue = queues[doctor_id]
+            visit_id = queue[len(queue) // 2 + (index // DOCTORS) % (len(queue) // 2)]
+            subscribers.append((f'/api/patient/queue/stream?visit_id={visit_id}', doctor_id))
+
+    received = [[] for _ in subscribers]
+    connected = threading.Semaphore(0)
+    failures = []
+
+    def listen(index, url):
+        response = app.test_client().get(url, buffered=False)
+        if response.status_code != 200:
+            failures.append(f'{response.status_code} {url}')
+            connected.release()
+            return
+        first = True
+        for chunk in response.response:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if EVENT.search(text):
+                if first:
+                    first = False
+                    connected.release()
+                else:
+                    received[index].append(time.time())
+
+    before = resident_kb()
+    threading.stack_size(256 * 1024)
+    for index, (url, _) in enumerate(subscribers):
+        threading.Thread(target=listen, args=(index, url), daemon=True).start()
+    for _ in subscribers:
+        connected.acquire()
+    if failures:
+        print(f'{len(failures)} streams refused, e.g. {failures[0]}')
+        sys.exit(1)
+    per_client = (resident_kb() - before) / len(subscribers)
+    print(f'{len(subscribers)} clients connected, {per_client:.1f}kB resident per client '
+          f'(including its listener thread)')
+
+    # Alternate doctors; each round starts the next visit at the front of the queue
+    fronts = {doctor_id: iter(queue) for doctor_id, queue in queues.items()}
+    local = app.test_client()
+    secretaries = {doctor_id: auth_header(app, f'secretary-{doctor_id}') for doctor_id in queues}
+    writer = subprocess.Popen([sys.executable, __file__, '--writer', database_path],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    rounds = []     # (path, doctor_id, started)
+    for path in ('commit hook', 'change log'):
+        for number in range(args.rounds):
+            doctor_id = 1 + number % DOCTORS
+            visit_id = next(fronts[doctor_id])
+            if path == 'commit hook':
+                started = time.time()
+                status = local.put(f'/api/secretary/visits/{visit_id}', headers=secretaries[doctor_id],
+                                   json={'status': 'in_progress'}).status_code
+            else:
+                writer.stdin.write(f'{visit_id} {doctor_id}\n')
+                writer.stdin.flush()
+                started, status = writer.stdout.readline().split()
+                started, status = float(started), int(status)
+            assert status == 200, status
+            rounds.append((path, doctor_id, started))
+            time.sleep(args.interval)
+    writer.stdin.close()
+    writer.wait()
+
+    # Every subscriber of the doctor should hear about each of its rounds
+    latencies = defaultdict(list)
+    missed = defaultdict(int)
+    for number, (path, doctor_id, started) in enumerate(rounds):
+        ends = rounds[number + 1][2] if number + 1 < len(rounds) else float('inf')
+        for index, (_, subscribed) in enumerate(subscribers):
+            if subscribed != doctor_id:
+                continue
+            arrivals = [arrived for arrived in received[index] if started <= arrived < ends]
+            if arrivals:
+                latencies[path].append(arrivals[0] - started)
+            else:
+                missed[path] += 1
+
+    for path in ('commit hook', 'change log'):
+        values = latencies[path]
+        print(f'{path:>12}: {len(values)} deliveries, p50={percentile(values, 0.5) * 1000:.0f}ms '
+              f'p95={percentile(values, 0.95) * 1000:.0f}ms max={max(values) * 1000:.0f}ms, '
+              f'{missed[path]} missed')
+    sys.exit(1 if any(missed.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
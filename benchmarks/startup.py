@@ -0,0 +1,98 @@
+"""Startup cost: what each worker pays before serving its first request.
+
+Each measurement runs in a fresh interpreter. "create_app" is the old
+single-step startup every worker used to run; with src/serve.py the
+bootstrap runs once in the master and every worker only pays for the
+import (shared by preloading) plus init_worker().
+
+    python benchmarks/startup.py --workers 8 --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT
+
+
+def measure(database_path):
+    """Time each startup phase in this process; called in a child interpreter"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    sys.path.insert(0, ROOT)
+
+    started = time.perf_counter()
+    import src.main as main
+    timings = {'import': time.perf_counter() - started}
+
+    started = time.perf_counter()
+    main.bootstrap_database()
+    timings['bootstrap_database'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    main.init_worker()
+    timings['init_worker'] = time.perf_counter() - started
+    return timings
+
+
+def run_child(database_path, extra_env=None):
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', database_path],
+        env={**os.environ, **(extra_env or {})}, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='existing dataset (default: a generated one)')
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--visits', type=int, default=300000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child)))
+        return
+
+    database = args.database
+    if database is None:
+        handle, database = tempfile.mkstemp(prefix='hospital-startup-', suffix='.db')
+        os.close(handle)
+        os.unlink(database)
+        subprocess.run([
+            sys.executable, os.path.join(os.path.dirname(__file__), 'generate_dataset.py'), '--database', database,
+            '--doctors', '50', '--patients', str(args.patients), '--visits', str(args.visits), '--bcrypt-rounds', '4'
+        ], check=True, capture_output=True)
+
+    # A brand new database pays for the schema, search index and default users
+    handle, empty = tempfile.mkstemp(prefix='hospital-startup-empty-', suffix='.db')
+    os.close(handle)
+    os.unlink(empty)
+    first_boot = run_child(empty, {'BCRYPT_ROUNDS': '12'})
+    os.unlink(empty)
+
+    runs = [run_child(database) for _ in range(args.repeat)]
+    best = {phase: min(run[phase] for run in runs) for phase in runs[0]}
+
+    print(f'First boot on an empty database: bootstrap {first_boot["bootstrap_database"] * 1000:.0f}ms')
+    print(f'Restart on {database}, best of {args.repeat}:')
+    for phase, seconds in best.items():
+        print(f'{phase:>20}: {seconds * 1000:8.1f}ms')
+
+    per_worker_before = best['import'] + best['bootstrap_database'] + best['init_worker']
+    total_after = best['import'] + best['bootstrap_database'] + args.workers * best['init_worker']
+    print(f'{args.workers} workers, create_app in each: {args.workers * per_worker_before * 1000:8.1f}ms of startup work')
+    print(f'{args.workers} workers, preloaded:           {total_after * 1000:8.1f}ms of startup work')
+
+    if args.database is None:
+        os.unlink(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Visit list encoding: per-row dicts through the JSON provider versus JSONColumns.
+
+Loads a scratch database with visits, fetches the serialized_query rows
+once and times only the conversion of those rows to a JSON body.
+
+    python benchmarks/visit_serialization.py --visits 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, seed
+
+STATUSES = ['waiting', 'in_progress', 'completed', 'completed', 'completed', 'cancelled']
+
+
+def fill_visits(app, count, rng):
+    from src.main import db
+
+    start = date.today() - timedelta(days=365)
+    rows = []
+    for i in range(count):
+        visit_date = start + timedelta(days=i * 365 // count)
+        created_at = datetime.combine(visit_date, datetime.min.time()) + timedelta(seconds=rng.randint(28800, 61200))
+        status = rng.choice(STATUSES)
+        completed = status == 'completed'
+        rows.append((
+            rng.randint(1, 1000), rng.randint(1, 10), i + 1, status, 'Follow-up visit' if i % 3 else None,
+            visit_date.isoformat(),
+            (created_at + timedelta(minutes=20)).isoformat(sep=' ') if completed else None,
+            rng.randint(1, 5) if completed and i % 2 else None,
+            'Thanks' if completed and i % 5 == 0 else None, None,
+            created_at.isoformat(sep=' '), created_at.isoformat(sep=' ')
+        ))
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        connection.executemany(
+            'INSERT INTO visit (patient_id, doctor_id, queue_number, status, description, visit_date, completed_at, '
+            'rating, patient_notes, admin_notes, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        connection.commit()
+        connection.close()
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = load_app()
+    seed(app, doctors=10, patients=1000)
+    fill_visits(app, args.visits, random.Random(42))
+
+    from flask.json.provider import DefaultJSONProvider
+    from src.models.visit import Visit
+    from src.services.json_provider import FastJSONProvider, orjson
+
+    with app.app_context():
+        rows = Visit.serialized_query().order_by(Visit.visit_date, Visit.id).all()
+
+    stdlib = DefaultJSONProvider(app)
+    candidates = [
+        ('dicts + stdlib json', lambda: stdlib.dumps(
+            [Visit.row_to_dict(row, True) for row in rows], separators=(',', ':'))),
+    ]
+    if orjson is not None:
+        fast = FastJSONProvider(app)
+        candidates.append(('dicts + orjson', lambda: fast.dumps_bytes(
+            [Visit.row_to_dict(row, True) for row in rows])))
+    else:
+        print('orjson is not installed; skipping the orjson provider')
+    candidates.append(('JSONColumns', lambda: Visit.json_columns(True).encode(rows)))
+
+    print(f'Encoding {len(rows)} visits, best of {args.repeat}')
+    baseline = None
+    for label, function in candidates:
+        seconds, size = best_of(args.repeat, function)
+        baseline = baseline or seconds
+        print(f'{label:>20}: {seconds * 1000:8.1f}ms  {size / 1e6:6.1f}MB  {baseline / seconds:4.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,63 +3,181 @@ import sys
 # DON'T CHANGE: Add the project root to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import click
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-import bcrypt
+from src.config import configure_database, apply_sqlite_pragmas
 from src.models.user import db, User
 from src.models.department import Department
 from src.models.doctor import Doctor
 from src.models.patient import Patient
 from src.models.visit import Visit
+from src.models.visit_archive import VisitArchive
+from src.models.queue_counter import QueueCounter
+from src.models.doctor_stats import DoctorDailyStats
+from src.models.visit_change_log import VisitChangeLog
+from src.models.schema import upgrade_schema, explain_queries
+from src.services.live_queue import live_queue
+from src.services import queue_stream, doctor_stats, patient_search, delta_sync
+from src.services.archive import archive_visits, archive_scheduler
+from src.services.wait_times import wait_time_model, backtest as backtest_wait_times
+from src.services.password_hashing import password_hasher
+from src.services.group_commit import group_commit
+from src.services.json_provider import configure_json
+from src.services import analytics, metrics
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.central import central_bp
 from src.routes.secretary import secretary_bp
 from src.routes.patient import patient_bp
+from src.routes.metrics import metrics_bp
 from src.routes.frontend import frontend_bp
+from datetime import date
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-in-production'
+# EventSource streams cannot send an Authorization header
+app.config['JWT_TOKEN_LOCATION'] = ['headers', 'query_string']
+
+# Password hashing: bcrypt cost factor and the login verification pool
+app.config['BCRYPT_ROUNDS'] = int(os.environ.get('BCRYPT_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+# Group commit: ratings and visit updates from concurrent requests share
+# one transaction every few milliseconds (off by default)
+app.config['GROUP_COMMIT'] = os.environ.get('GROUP_COMMIT', '').lower() in ('1', 'true', 'yes')
+app.config['GROUP_COMMIT_MAX_DELAY_MS'] = float(os.environ.get('GROUP_COMMIT_MAX_DELAY_MS', 2))
+app.config['GROUP_COMMIT_MAX_BATCH'] = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 64))
+app.config['GROUP_COMMIT_MAX_PENDING'] = int(os.environ.get('GROUP_COMMIT_MAX_PENDING', 256))
+app.config['GROUP_COMMIT_TIMEOUT'] = float(os.environ.get('GROUP_COMMIT_TIMEOUT', 5))
+
+# Archiving of old completed/cancelled visits; the in-process job is off
+# unless ARCHIVE_INTERVAL_SECONDS is set (cron can run `flask archive-visits`)
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+app.config['ARCHIVE_INTERVAL_SECONDS'] = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 0))
+# Delta sync tokens older than this must reload the full list; the change
+# log is pruned every SYNC_PRUNE_INTERVAL_SECONDS (0 leaves it to cron and
+# `flask prune-change-log`)
+app.config['SYNC_RETENTION_DAYS'] = int(os.environ.get('SYNC_RETENTION_DAYS', 7))
+app.config['SYNC_PRUNE_INTERVAL_SECONDS'] = int(os.environ.get('SYNC_PRUNE_INTERVAL_SECONDS', 3600))
+
+# Event streams per process. Under the threaded server each open stream
+# holds a request thread; serve.py adds WEB_STREAMS threads on top of
+# WEB_THREADS so that streams never take the threads API requests need.
+app.config['STREAM_MAX_SUBSCRIBERS'] = int(os.environ.get('WEB_STREAMS', 64))
+
+# Analytics answer from an in-memory snapshot refreshed at most this often
+app.config['ANALYTICS_REFRESH_SECONDS'] = float(os.environ.get('ANALYTICS_REFRESH_SECONDS', 60))
+
+# Use the faster JSON encoder when it is installed (JSON_ENCODER=stdlib opts out)
+configure_json(app)
 
 # Enable CORS for all routes
 CORS(app)
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# Database configuration (URI, pool and SQLite profile come from the environment)
+configure_database(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
+with app.app_context():
+    apply_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+
+# Per-endpoint latency and SQL metrics, served at /metrics
+app.config['SLOW_QUERY_SECONDS'] = float(os.environ.get('SLOW_QUERY_SECONDS', 0.25))
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+metrics.init_app(app)
 
 # Initialize JWT
 jwt = JWTManager(app)
 
-def create_app():
+password_hasher.init_app(app)
+group_commit.init_app(app)
+queue_stream.hub.init_app(app)
+
+def bootstrap_database():
+    """One-time database setup: schema, search index, default users and stats backfill.
+
+    Safe to repeat, but only needs to run once per deployment, not once per
+    worker process.
+    """
     with app.app_context():
-        # Create database tables
-        db.create_all()
+        # Create database tables and any indexes missing from an existing database
+        upgrade_schema()
+        patient_search.install()
         
         # Create default users if they don't exist
+        created = []
         if not User.query.filter_by(username='admin').first():
             admin_user = User(
                 username='admin',
-                password_hash=bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+                password_hash=password_hasher.hash('admin123'),
                 role='central'
             )
             db.session.add(admin_user)
+            created.append("Admin: username=admin, password=admin123")
             
         if not User.query.filter_by(username='secretary1').first():
             secretary_user = User(
                 username='secretary1',
-                password_hash=bcrypt.hashpw('secretary123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+                password_hash=password_hasher.hash('secretary123'),
                 role='secretary'
             )
             db.session.add(secretary_user)
+            created.append("Secretary: username=secretary1, password=secretary123")
             
         db.session.commit()
-        print("Default users created:")
-        print("Admin: username=admin, password=admin123")
-        print("Secretary: username=secretary1, password=secretary123")
+        if created:
+            print("Default users created:")
+            for line in created:
+                print(line)
+        
+        # Backfill the per-doctor daily stats the first time they exist
+        if not DoctorDailyStats.query.first() and Visit.query.first():
+            doctor_stats.rebuild()
+        
+        # Workers open their own connections
+        db.engine.dispose()
+
+def init_worker():
+    """Per-process state: today's live queue, the wait-time model, the analytics snapshot and the archive/prune jobs.
+
+    Preforking servers call this in every worker after the fork.
+    """
+    with app.app_context():
+        # Never share pooled connections inherited from the parent process
+        db.engine.dispose(close=False)
+        
+        # Load today's queues into memory
+        live_queue.rebuild(date.today())
+        
+        # Preforking servers train and build these once before the fork (see serve.py)
+        wait_time_model.ensure_trained()
+        analytics.snapshot.ensure_built()
+    
+    archive_scheduler.start(
+        app,
+        app.config['ARCHIVE_INTERVAL_SECONDS'],
+        app.config['SYNC_PRUNE_INTERVAL_SECONDS'],
+        app.config['ARCHIVE_AFTER_DAYS'],
+        app.config['ARCHIVE_BATCH_SIZE'],
+        app.config['SYNC_RETENTION_DAYS']
+    )
+
+def create_app(bootstrap=True, worker=True):
+    """Set up the database and register the blueprints.
+
+    ``bootstrap`` runs bootstrap_database(); ``worker`` runs init_worker()
+    in this process, which a preforking server leaves to its workers.
+    """
+    if bootstrap:
+        bootstrap_database()
+    if worker:
+        init_worker()
 
     # Register blueprints
     app.register_blueprint(user_bp, url_prefix='/api/users')
@@ -67,14 +185,102 @@ def create_app():
     app.register_blueprint(central_bp, url_prefix='/api/central')
     app.register_blueprint(secretary_bp, url_prefix='/api/secretary')
     app.register_blueprint(patient_bp, url_prefix='/api/patient')
+    app.register_blueprint(metrics_bp)
     app.register_blueprint(frontend_bp)  # No prefix for frontend routes
     
     return app
 
+@app.cli.command('bootstrap-db')
+def bootstrap_db_command():
+    """Run the one-time database setup (schema, search index, default users, stats)"""
+    bootstrap_database()
+    print("Database ready")
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Add missing tables and indexes to the existing database"""
+    with app.app_context():
+        created = upgrade_schema()
+        patient_search.install()
+    for name in created:
+        print(f"Created index {name}")
+    print(f"Schema up to date ({len(created)} indexes created)")
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    """Print the query plan of each hot route query; fail on full table scans"""
+    with app.app_context():
+        results = explain_queries()
+    
+    failed = False
+    for name, plan, scans in results:
+        print(f"{'FAIL' if scans else 'ok'}  {name}")
+        for line in plan:
+            print(f"        {line}")
+        failed = failed or bool(scans)
+    
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the per-doctor daily stats from the visit table"""
+    with app.app_context():
+        count = doctor_stats.rebuild()
+    print(f"Rebuilt {count} doctor/day stats rows")
+
+@app.cli.command('check-live-queue')
+def check_live_queue_command():
+    """Compare the in-memory queue positions for today with the database"""
+    with app.app_context():
+        mismatches = live_queue.verify()
+    
+    for visit_id, cached, expected in mismatches:
+        print(f"Visit {visit_id}: cached {cached} ahead, database {expected}")
+    if mismatches:
+        raise SystemExit(1)
+    print("Live queue matches the database")
+
+@app.cli.command('archive-visits')
+@click.option('--after-days', type=int, default=None, help='Archive visits older than this (default: ARCHIVE_AFTER_DAYS)')
+@click.option('--batch-size', type=int, default=None, help='Visits moved per transaction (default: ARCHIVE_BATCH_SIZE)')
+def archive_visits_command(after_days, batch_size):
+    """Move old completed and cancelled visits to the archive table"""
+    with app.app_context():
+        moved = archive_visits(
+            after_days if after_days is not None else app.config['ARCHIVE_AFTER_DAYS'],
+            batch_size or app.config['ARCHIVE_BATCH_SIZE']
+        )
+    print(f"Archived {moved} visits")
+
+@app.cli.command('prune-change-log')
+@click.option('--days', type=int, default=None, help='Keep this many days of changes (default: SYNC_RETENTION_DAYS)')
+def prune_change_log_command(days):
+    """Delete old delta sync change log rows"""
+    with app.app_context():
+        pruned = delta_sync.prune(days if days is not None else app.config['SYNC_RETENTION_DAYS'])
+    print(f"Pruned {pruned} change log rows")
+
+@app.cli.command('backtest-wait-times')
+@click.option('--days', type=int, default=28, help='Replay this many recent days against a model trained on older ones')
+def backtest_wait_times_command(days):
+    """Compare predicted and actual waiting times over recent history"""
+    with app.app_context():
+        results = backtest_wait_times(days)
+    
+    if not results:
+        print("No completed visits in the backtest period")
+        return
+    print(f"{'predictor':<14} {'visits':>8} {'MAE':>8} {'median':>8} {'p90':>8} {'bias':>8}  (minutes)")
+    for name, result in results.items():
+        print(f"{name:<14} {result['visits']:>8} {result['mae']:>8.1f} {result['median_ae']:>8.1f} "
+              f"{result['p90_ae']:>8.1f} {result['bias']:>+8.1f}")
+
 if __name__ == '__main__':
     # Initialize the app
     create_app()
     
-    # Run the application
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server; production runs src/serve.py. FLASK_DEBUG=1 enables
+    # the debugger and reloader.
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
 
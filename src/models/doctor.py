@@ -1,7 +1,12 @@
 from src.models.user import db
+from src.models.json_columns import json_value
 from datetime import datetime
 
 class Doctor(db.Model):
+    # Field names accepted by ?fields= on doctor lists
+    FIELDS = ('id', 'name', 'department_id', 'department_name', 'specialization', 'is_active',
+              'can_assign_patients', 'created_at', 'updated_at')
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
@@ -18,7 +23,14 @@ class Doctor(db.Model):
     def __repr__(self):
         return f'<Doctor {self.name}>'
 
-    def to_dict(self):
+    def to_dict(self, fields=None):
+        if fields is not None:
+            # Sparse fieldset: only touch the requested (and loaded) attributes
+            return {
+                name: (self.department.name if self.department else None) if name == 'department_name'
+                else json_value(getattr(self, name))
+                for name in fields
+            }
         return {
             'id': self.id,
             'name': self.name,
@@ -0,0 +1,24 @@
+from src.models.user import db
+
+class DoctorDailyStats(db.Model):
+    """Running totals of a doctor's visits for one day, maintained as visits change"""
+    __tablename__ = 'doctor_daily_stats'
+
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), primary_key=True)
+    visit_date = db.Column(db.Date, primary_key=True)
+    total_visits = db.Column(db.Integer, nullable=False, default=0)
+    waiting_count = db.Column(db.Integer, nullable=False, default=0)
+    in_progress_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    # Sum of completed_at - created_at over completed visits, in seconds
+    service_seconds = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DoctorDailyStats {self.doctor_id} {self.visit_date}>'
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
@@ -0,0 +1,66 @@
+from datetime import date
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+
+def _integers(values):
+    return ['null' if value is None else str(value) for value in values]
+
+
+def _strings(values):
+    return ['null' if value is None else encode_basestring_ascii(value) for value in values]
+
+
+def _timestamps(values):
+    return ['null' if value is None else '"' + value.isoformat() + '"' for value in values]
+
+
+ENCODERS = {
+    'int': _integers,
+    'str': _strings,
+    'date': _timestamps,
+    'datetime': _timestamps,
+}
+
+
+def json_value(value):
+    """A column value as it appears in the to_dict payloads"""
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class JSONColumns:
+    """Writes result rows as JSON objects without building a dict per row.
+
+    ``fields`` are (name, kind) pairs naming row columns and one of the
+    ENCODERS kinds. Rows are transposed and every column is encoded in one
+    pass; each object is then filled into a template with the keys already
+    in place. The output is byte-for-byte what Flask's default provider
+    writes for the equivalent dicts (sorted keys, compact, ASCII).
+    """
+
+    def __init__(self, fields):
+        self.fields = sorted(fields)
+        for _, kind in self.fields:
+            if kind not in ENCODERS:
+                raise ValueError(f'Unknown column kind {kind!r}')
+        self.template = '{' + ','.join(
+            encode_basestring_ascii(name).replace('%', '%%') + ':%s' for name, _ in self.fields
+        ) + '}'
+
+    def encode_each(self, rows):
+        """One JSON object string per row"""
+        if not rows:
+            return []
+        positions = {name: index for index, name in enumerate(rows[0]._fields)}
+        columns = list(zip(*rows))
+        encoded = [ENCODERS[kind](columns[positions[name]]) for name, kind in self.fields]
+        return list(map(self.template.__mod__, zip(*encoded)))
+
+    def encode(self, rows):
+        """JSON array of the rows"""
+        return '[' + ','.join(self.encode_each(rows)) + ']'
+
+    @lru_cache(maxsize=64)
+    def subset(self, fields):
+        """JSONColumns writing only ``fields`` (a tuple of names), for sparse fieldsets"""
+        return JSONColumns([(name, kind) for name, kind in self.fields if name in fields])
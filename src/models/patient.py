@@ -1,12 +1,16 @@
 from src.models.user import db
+from src.models.json_columns import JSONColumns, json_value
 from datetime import datetime
 
 class Patient(db.Model):
+    # Field names accepted by ?fields= on patient lists
+    FIELDS = ('id', 'social_id', 'name', 'age', 'phone', 'created_at', 'updated_at')
+
     id = db.Column(db.Integer, primary_key=True)
     social_id = db.Column(db.String(50), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer, nullable=False)
-    phone = db.Column(db.String(20), nullable=False)
+    phone = db.Column(db.String(20), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -16,7 +20,10 @@ class Patient(db.Model):
     def __repr__(self):
         return f'<Patient {self.name}>'
 
-    def to_dict(self):
+    def to_dict(self, fields=None):
+        if fields is not None:
+            # Sparse fieldset: only touch the requested (and loaded) columns
+            return {name: json_value(getattr(self, name)) for name in fields}
         return {
             'id': self.id,
             'social_id': self.social_id,
@@ -27,3 +34,14 @@ class Patient(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    @staticmethod
+    def json_columns(fields=None):
+        """JSONColumns writing rows of the patient table columns in the to_dict format"""
+        return _JSON_COLUMNS if fields is None else _JSON_COLUMNS.subset(tuple(fields))
+
+
+_JSON_COLUMNS = JSONColumns([
+    ('id', 'int'), ('social_id', 'str'), ('name', 'str'), ('age', 'int'), ('phone', 'str'),
+    ('created_at', 'datetime'), ('updated_at', 'datetime')
+])
+
@@ -0,0 +1,10 @@
+from src.models.user import db
+
+class QueueCounter(db.Model):
+    """Last queue number handed out per doctor per day"""
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), primary_key=True)
+    visit_date = db.Column(db.Date, primary_key=True)
+    last_number = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<QueueCounter {self.doctor_id} {self.visit_date}: {self.last_number}>'
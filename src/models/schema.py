@@ -0,0 +1,126 @@
+import logging
+import re
+from datetime import date, datetime, time
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db, User
+from src.models.queue_counter import QueueCounter
+from src.models.patient import Patient
+from src.models.visit import Visit
+from src.models.visit_change_log import VisitChangeLog
+from src.models.visit_archive import patient_history
+
+logger = logging.getLogger(__name__)
+
+# Indexes created by earlier versions, mapped to the index that replaces them
+OBSOLETE_INDEXES = {
+    'ix_visit_doctor_date_queue': 'uq_visit_doctor_date_queue',
+}
+
+
+def upgrade_schema():
+    """Bring an existing database up to date with the models.
+
+    db.create_all() only creates missing tables; indexes declared on tables
+    that already exist are skipped. This creates those missing indexes too
+    and drops the ones listed in OBSOLETE_INDEXES once their replacement
+    exists, leaving existing tables and data untouched. Returns the names of
+    the indexes that were created.
+    """
+    db.create_all()
+
+    existing = set()
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing.update(index['name'] for index in inspector.get_indexes(table.name))
+
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=db.engine)
+            except IntegrityError:
+                # Existing rows violate a new unique index; keep serving and
+                # let the operator clean the data up and rerun upgrade-db.
+                logger.warning('Could not create unique index %s: duplicate rows exist', index.name)
+                continue
+            created.append(index.name)
+
+    with db.engine.begin() as connection:
+        for name, replacement in OBSOLETE_INDEXES.items():
+            # Keep the old index until its replacement could be built
+            if name in existing and (replacement in existing or replacement in created):
+                connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+    return created
+
+
+def hot_queries():
+    """The queries run by the busiest routes, keyed by a descriptive name"""
+    today = date.today()
+    return {
+        'queue counter seed (central/secretary create_visit)': Visit.query.with_entities(
+            func.max(Visit.queue_number)
+        ).filter_by(doctor_id=1, visit_date=today),
+        'queue counter row': QueueCounter.query.filter_by(doctor_id=1, visit_date=today),
+        'secretary daily visits': Visit.serialized_query().filter(
+            Visit.doctor_id == 1, Visit.visit_date == today
+        ).order_by(Visit.queue_number),
+        'patient current visit (patient queue)': Visit.query.filter_by(
+            patient_id=1, visit_date=today
+        ).filter(Visit.status.in_(['waiting', 'in_progress'])).limit(1),
+        'patients ahead (patient queue)': Visit.query.with_entities(func.count(Visit.id)).filter_by(
+            doctor_id=1, visit_date=today, status='waiting'
+        ).filter(Visit.queue_number < 10),
+        'patient history (live and archived)': patient_history(1).order_by(
+            Visit.created_at.desc(), Visit.id.desc()
+        ).limit(50),
+        'archive candidates': Visit.query.with_entities(Visit.id).filter(
+            Visit.visit_date < today, Visit.status.in_(['completed', 'cancelled'])
+        ).order_by(Visit.visit_date, Visit.id).limit(500),
+        'patient by phone': Patient.query.filter_by(phone='0000000000').limit(1),
+        'patient by social id': Patient.query.filter_by(social_id='0').limit(1),
+        'user by username (login)': User.query.filter_by(username='admin').limit(1),
+        'central visits by date range': Visit.serialized_query().filter(
+            Visit.visit_date >= today, Visit.visit_date <= today
+        ).order_by(Visit.visit_date, Visit.id).limit(100),
+        'secretary delta sync (changes after a token)': VisitChangeLog.query.filter(
+            VisitChangeLog.doctor_id == 1, VisitChangeLog.visit_date == today, VisitChangeLog.seq > 0
+        ).order_by(VisitChangeLog.seq).limit(1001),
+        'central delta sync (changes after a token)': VisitChangeLog.query.filter(
+            VisitChangeLog.seq > 0
+        ).order_by(VisitChangeLog.seq).limit(1001),
+        "today's completions (wait time averages)": Visit.query.with_entities(
+            Visit.doctor_id, Visit.completed_at
+        ).filter(
+            Visit.visit_date == today, Visit.status == 'completed', Visit.completed_at.isnot(None)
+        ).order_by(Visit.doctor_id, Visit.completed_at),
+        'analytics refresh (recently updated visits)': Visit.query.filter(
+            Visit.updated_at >= datetime.combine(today, time.min)
+        ),
+    }
+
+
+# "SCAN <table>" without an index means every row of the table is read.
+# "SCAN <table> USING INDEX" walks an index in order and is accepted.
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def explain_queries():
+    """Run EXPLAIN QUERY PLAN for each hot query.
+
+    Returns a list of (name, plan lines, full scans) tuples where full scans
+    lists the tables read without an index.
+    """
+    results = []
+    with db.engine.connect() as connection:
+        for name, query in hot_queries().items():
+            sql = str(query.statement.compile(
+                dialect=db.engine.dialect,
+                compile_kwargs={'literal_binds': True}
+            ))
+            plan = [row[3] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+            scans = [match.group(1) for match in map(FULL_SCAN.match, plan) if match]
+            results.append((name, plan, scans))
+    return results
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import bcrypt
+from src.services.password_hashing import password_hasher
 
 db = SQLAlchemy()
 
@@ -18,7 +19,7 @@ class User(db.Model):
 
     def set_password(self, password):
         """Hash and set the password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """Check if the provided password matches the hash"""
@@ -1,7 +1,37 @@
 from src.models.user import db
+from src.models.department import Department
+from src.models.doctor import Doctor
+from src.models.patient import Patient
+from src.models.json_columns import JSONColumns, json_value
 from datetime import datetime
 
+_JSON_FIELDS = [
+    ('id', 'int'), ('patient_id', 'int'), ('patient_name', 'str'), ('patient_phone', 'str'),
+    ('doctor_id', 'int'), ('doctor_name', 'str'), ('department_name', 'str'),
+    ('queue_number', 'int'), ('status', 'str'), ('description', 'str'),
+    ('visit_date', 'date'), ('completed_at', 'datetime'), ('rating', 'int'),
+    ('patient_notes', 'str'), ('created_at', 'datetime'), ('updated_at', 'datetime')
+]
+
+
 class Visit(db.Model):
+    __table_args__ = (
+        # One queue number per doctor per day; also serves the secretary's daily list
+        db.Index('uq_visit_doctor_date_queue', 'doctor_id', 'visit_date', 'queue_number', unique=True),
+        # Patient's active visit for today (/api/patient/queue)
+        db.Index('ix_visit_patient_date_status', 'patient_id', 'visit_date', 'status'),
+        # Patient history, newest first
+        db.Index('ix_visit_patient_created', 'patient_id', 'created_at'),
+        # Date filters and keyset paging of the central list
+        db.Index('ix_visit_date', 'visit_date'),
+        # Incremental refresh of the analytics snapshot
+        db.Index('ix_visit_updated_at', 'updated_at'),
+    )
+
+    # Field names accepted by ?fields= on visit lists
+    FIELDS = tuple(name for name, _ in _JSON_FIELDS)
+    ADMIN_FIELDS = FIELDS + ('admin_notes',)
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
@@ -20,27 +50,116 @@ class Visit(db.Model):
         return f'<Visit {self.id} - Patient: {self.patient_id}, Doctor: {self.doctor_id}>'
 
     def to_dict(self, include_admin_notes=False):
-        result = {
-            'id': self.id,
-            'patient_id': self.patient_id,
-            'patient_name': self.patient.name if self.patient else None,
-            'patient_phone': self.patient.phone if self.patient else None,
-            'doctor_id': self.doctor_id,
-            'doctor_name': self.doctor.name if self.doctor else None,
-            'department_name': self.doctor.department.name if self.doctor and self.doctor.department else None,
-            'queue_number': self.queue_number,
-            'status': self.status,
-            'description': self.description,
-            'visit_date': self.visit_date.isoformat() if self.visit_date else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'rating': self.rating,
-            'patient_notes': self.patient_notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
-        
-        if include_admin_notes:
-            result['admin_notes'] = self.admin_notes
-            
-        return result
+        patient = self.patient
+        doctor = self.doctor
+        department = doctor.department if doctor else None
+        return _build_dict(
+            self,
+            patient.name if patient else None,
+            patient.phone if patient else None,
+            doctor.name if doctor else None,
+            department.name if department else None,
+            include_admin_notes
+        )
+
+    @classmethod
+    def serialized_query(cls, fields=None, keys=()):
+        """Query visit columns joined with the names shown in to_dict, one row per visit.
+
+        Use this for list endpoints instead of Visit.query + to_dict, which lazy
+        loads patient, doctor and department separately for every row.
+        Filter with Visit.<column> expressions, not filter_by.
+
+        ``fields`` (see pagination.fields_arg) limits the selected columns
+        to a sparse fieldset; ``keys`` names columns needed besides them,
+        such as the keyset paging columns.
+        """
+        return serialized_visit_query(cls, list(cls.__table__.columns), fields, keys)
+
+    @staticmethod
+    def row_to_dict(row, include_admin_notes=False, fields=None):
+        """Build the to_dict payload from a serialized_query row"""
+        if fields is not None:
+            return {name: json_value(getattr(row, name)) for name in fields}
+        return _build_dict(
+            row,
+            row.patient_name,
+            row.patient_phone,
+            row.doctor_name,
+            row.department_name,
+            include_admin_notes
+        )
+
+    @classmethod
+    def serialize(cls, query, include_admin_notes=False, fields=None):
+        """Run a serialized_query and return the list of visit dicts"""
+        return [cls.row_to_dict(row, include_admin_notes, fields) for row in query]
+
+    @staticmethod
+    def json_columns(include_admin_notes=False, fields=None):
+        """JSONColumns writing serialized_query rows in the to_dict format"""
+        columns = _JSON_COLUMNS_ADMIN if include_admin_notes else _JSON_COLUMNS
+        return columns if fields is None else columns.subset(tuple(fields))
+
+    @classmethod
+    def serialize_json(cls, query, include_admin_notes=False, fields=None):
+        """Run a serialized_query and return the JSON text of Visit.serialize"""
+        return cls.json_columns(include_admin_notes, fields).encode(query.all())
+
+
+def serialized_visit_query(model, columns, fields=None, keys=()):
+    """serialized_query over ``model``, whose visit ``columns`` are in Visit.__table__ order.
+
+    Without ``fields`` every column is selected. Otherwise only the named
+    columns (and ``keys``) are read, and the patient and department joins
+    are left out when none of their names are wanted; the doctor join
+    stays, since list filters use Doctor.department_id.
+    """
+    wanted = None if fields is None else {*fields, *keys}
+    selected = [column for column in columns if wanted is None or column.name in wanted]
+    names = [
+        label for label in (
+            Patient.name.label('patient_name'),
+            Patient.phone.label('patient_phone'),
+            Doctor.name.label('doctor_name'),
+            Department.name.label('department_name')
+        ) if wanted is None or label.name in wanted
+    ]
+
+    query = db.session.query(*selected, *names).select_from(model)
+    if wanted is None or wanted & {'patient_name', 'patient_phone'}:
+        query = query.outerjoin(Patient, model.patient_id == Patient.id)
+    query = query.outerjoin(Doctor, model.doctor_id == Doctor.id)
+    if wanted is None or 'department_name' in wanted:
+        query = query.outerjoin(Department, Doctor.department_id == Department.id)
+    return query
+
+
+def _build_dict(visit, patient_name, patient_phone, doctor_name, department_name, include_admin_notes):
+    result = {
+        'id': visit.id,
+        'patient_id': visit.patient_id,
+        'patient_name': patient_name,
+        'patient_phone': patient_phone,
+        'doctor_id': visit.doctor_id,
+        'doctor_name': doctor_name,
+        'department_name': department_name,
+        'queue_number': visit.queue_number,
+        'status': visit.status,
+        'description': visit.description,
+        'visit_date': visit.visit_date.isoformat() if visit.visit_date else None,
+        'completed_at': visit.completed_at.isoformat() if visit.completed_at else None,
+        'rating': visit.rating,
+        'patient_notes': visit.patient_notes,
+        'created_at': visit.created_at.isoformat() if visit.created_at else None,
+        'updated_at': visit.updated_at.isoformat() if visit.updated_at else None
+    }
+
+    if include_admin_notes:
+        result['admin_notes'] = visit.admin_notes
+
+    return result
+
 
+_JSON_COLUMNS = JSONColumns(_JSON_FIELDS)
+_JSON_COLUMNS_ADMIN = JSONColumns(_JSON_FIELDS + [('admin_notes', 'str')])
@@ -0,0 +1,56 @@
+from src.models.user import db
+from src.models.visit import Visit, serialized_visit_query
+from datetime import datetime
+
+class VisitArchive(db.Model):
+    """Completed and cancelled visits moved out of the visit table by the archiver.
+
+    Same columns (and ids) as Visit, so archived rows serialize exactly like
+    live ones.
+    """
+    __tablename__ = 'visit_archive'
+    __table_args__ = (
+        # Patient history, newest first
+        db.Index('ix_visit_archive_patient_created', 'patient_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    queue_number = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20))
+    description = db.Column(db.Text)
+    visit_date = db.Column(db.Date)
+    completed_at = db.Column(db.DateTime)
+    rating = db.Column(db.Integer)
+    patient_notes = db.Column(db.Text)
+    admin_notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<VisitArchive {self.id} - Patient: {self.patient_id}, Doctor: {self.doctor_id}>'
+
+    @classmethod
+    def visit_columns(cls):
+        """The archive columns matching Visit.__table__.columns, in the same order"""
+        return [cls.__table__.c[column.name] for column in Visit.__table__.columns]
+
+    @classmethod
+    def serialized_query(cls, fields=None, keys=()):
+        """Like Visit.serialized_query, over the archived visits"""
+        return serialized_visit_query(cls, cls.visit_columns(), fields, keys)
+
+
+def patient_history(patient_id, fields=None):
+    """Live and archived visits of a patient as one serialized_query.
+
+    Order and filter the result with Visit.<column> expressions; they apply
+    to both halves. With a sparse ``fields`` list, created_at is always
+    selected for the newest-first paging.
+    """
+    keys = ('created_at',)
+    return Visit.serialized_query(fields, keys).filter(Visit.patient_id == patient_id).union_all(
+        VisitArchive.serialized_query(fields, keys).filter(VisitArchive.patient_id == patient_id)
+    )
@@ -0,0 +1,24 @@
+from src.models.user import db
+from datetime import datetime
+
+class VisitChangeLog(db.Model):
+    """One row per visit change, numbered in commit order, for delta sync.
+
+    ``seq`` only grows: a client that has seen everything up to a seq asks
+    for the rows after it. ``deleted`` marks a tombstone.
+    """
+    __tablename__ = 'visit_change_log'
+    __table_args__ = (
+        # Secretary dashboards: one doctor's day after a seq
+        db.Index('ix_visit_change_log_doctor_date_seq', 'doctor_id', 'visit_date', 'seq'),
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    visit_id = db.Column(db.Integer, nullable=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    visit_date = db.Column(db.Date, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<VisitChangeLog {self.seq} visit {self.visit_id}{" deleted" if self.deleted else ""}>'
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from src.models.user import db, User
+from src.services.authorization import current_user
+from src.services.password_hashing import password_hasher, HasherOverloaded
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -16,8 +18,25 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
-            access_token = create_access_token(identity=user.id)
+        valid = False
+        if user:
+            try:
+                valid, new_hash = password_hasher.verify(password, user.password_hash)
+            except HasherOverloaded:
+                return jsonify({'error': 'Too many logins in progress, please retry shortly'}), 503, {'Retry-After': '1'}
+        
+        if valid:
+            if new_hash:
+                # Cost factor changed since this password was hashed
+                user.password_hash = new_hash
+                db.session.commit()
+            
+            # Role and doctor assignment travel in the token so role checks
+            # can reject other roles without a lookup
+            access_token = create_access_token(
+                identity=str(user.id),
+                additional_claims={'role': user.role, 'doctor_id': user.doctor_id}
+            )
             return jsonify({
                 'access_token': access_token,
                 'user': user.to_dict()
@@ -32,8 +51,7 @@ def login():
 @jwt_required()
 def get_current_user():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_user()
         
         if user:
             return jsonify({'user': user.to_dict()}), 200
@@ -1,44 +1,36 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User
+from flask import Blueprint, current_app, make_response, request, jsonify
+from src.models.user import db
 from src.models.department import Department
 from src.models.doctor import Doctor
 from src.models.patient import Patient
 from src.models.visit import Visit
+from src.models.doctor_stats import DoctorDailyStats
+from src.models.visit_change_log import VisitChangeLog
+from src.services.authorization import role_required
+from src.services import analytics, delta_sync
+from src.services.bulk_import import iter_records, import_patients, check_in_visits
+from src.services.group_commit import group_commit, WriterOverloaded
+from src.services.pagination import keyset_response, date_arg, fields_arg
+from src.services.queue_numbers import allocate_queue_number
+from src.services.reference_cache import cached_json
+from src.services.wait_times import wait_time_model
 from datetime import datetime, date
-from sqlalchemy import func
+from sqlalchemy.orm import joinedload, load_only
 
 central_bp = Blueprint('central', __name__)
 
-def require_central_role():
-    """Decorator to ensure user has central role"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user or user.role != 'central':
-        return jsonify({'error': 'Access denied. Central role required.'}), 403
-    return None
-
 # Department management
 @central_bp.route('/departments', methods=['GET'])
-@jwt_required()
+@role_required('central')
 def get_departments():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
-        departments = Department.query.all()
-        return jsonify([dept.to_dict() for dept in departments]), 200
+        return cached_json('departments', 'all', lambda: [dept.to_dict() for dept in Department.query.all()])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/departments', methods=['POST'])
-@jwt_required()
+@role_required('central')
 def create_department():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         data = request.get_json()
         department = Department(
@@ -53,12 +45,8 @@ def create_department():
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/departments/<int:dept_id>', methods=['PUT'])
-@jwt_required()
+@role_required('central')
 def update_department(dept_id):
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         department = Department.query.get_or_404(dept_id)
         data = request.get_json()
@@ -74,12 +62,8 @@ def update_department(dept_id):
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/departments/<int:dept_id>', methods=['DELETE'])
-@jwt_required()
+@role_required('central')
 def delete_department(dept_id):
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         department = Department.query.get_or_404(dept_id)
         db.session.delete(department)
@@ -91,25 +75,37 @@ def delete_department(dept_id):
 
 # Doctor management
 @central_bp.route('/doctors', methods=['GET'])
-@jwt_required()
+@role_required('central')
 def get_doctors():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
-        doctors = Doctor.query.all()
-        return jsonify([doctor.to_dict() for doctor in doctors]), 200
+        # ?fields= loads and returns only the named attributes
+        fields = fields_arg(Doctor.FIELDS)
+        query = Doctor.query
+        if fields is None or 'department_name' in fields:
+            query = query.options(joinedload(Doctor.department))
+        if fields is not None:
+            query = query.options(load_only(*[getattr(Doctor, name) for name in fields if name != 'department_name']))
+        
+        # The plain list is what every dashboard polls; serve it from the cache
+        if not set(request.args) - {'fields'}:
+            key = 'all' if fields is None else 'fields:' + ','.join(fields)
+            return cached_json('doctors', key, lambda: [doctor.to_dict(fields) for doctor in query.order_by(Doctor.id)])
+        
+        department_id = request.args.get('department_id', type=int)
+        if department_id:
+            query = query.filter(Doctor.department_id == department_id)
+        if request.args.get('is_active') is not None:
+            query = query.filter(Doctor.is_active == (request.args.get('is_active') == 'true'))
+        
+        return keyset_response(query, [Doctor.id], lambda doctor: doctor.to_dict(fields))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/doctors', methods=['POST'])
-@jwt_required()
+@role_required('central')
 def create_doctor():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         data = request.get_json()
         doctor = Doctor(
@@ -127,12 +123,8 @@ def create_doctor():
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/doctors/<int:doctor_id>', methods=['PUT'])
-@jwt_required()
+@role_required('central')
 def update_doctor(doctor_id):
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         doctor = Doctor.query.get_or_404(doctor_id)
         data = request.get_json()
@@ -151,12 +143,8 @@ def update_doctor(doctor_id):
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/doctors/<int:doctor_id>', methods=['DELETE'])
-@jwt_required()
+@role_required('central')
 def delete_doctor(doctor_id):
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         doctor = Doctor.query.get_or_404(doctor_id)
         db.session.delete(doctor)
@@ -168,25 +156,26 @@ def delete_doctor(doctor_id):
 
 # Patient management
 @central_bp.route('/patients', methods=['GET'])
-@jwt_required()
+@role_required('central')
 def get_patients():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
-        patients = Patient.query.all()
-        return jsonify([patient.to_dict() for patient in patients]), 200
+        # ?fields= reads and returns only the named columns
+        fields = fields_arg(Patient.FIELDS)
+        columns = Patient.__table__.columns
+        return keyset_response(
+            db.session.query(*(columns if fields is None else [columns[name] for name in fields])),
+            [Patient.id],
+            lambda row: Patient.to_dict(row, fields),
+            encoder=Patient.json_columns(fields)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/patients', methods=['POST'])
-@jwt_required()
+@role_required('central')
 def create_patient():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         data = request.get_json()
         
@@ -208,13 +197,22 @@ def create_patient():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@central_bp.route('/patients/bulk', methods=['POST'])
+@role_required('central')
+def bulk_create_patients():
+    """Import patients from CSV, NDJSON or a JSON array; known social IDs are skipped"""
+    try:
+        report = import_patients(iter_records(request))
+        return jsonify(report.to_dict()), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @central_bp.route('/patients/<int:patient_id>', methods=['PUT'])
-@jwt_required()
+@role_required('central')
 def update_patient(patient_id):
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         patient = Patient.query.get_or_404(patient_id)
         data = request.get_json()
@@ -232,41 +230,71 @@ def update_patient(patient_id):
 
 # Visit management
 @central_bp.route('/visits', methods=['GET'])
-@jwt_required()
+@role_required('central')
 def get_visits():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
-        visits = Visit.query.all()
-        return jsonify([visit.to_dict(include_admin_notes=True) for visit in visits]), 200
+        # ?fields= reads and returns only the named columns
+        fields = fields_arg(Visit.ADMIN_FIELDS)
+        query = Visit.serialized_query(fields, keys=('visit_date',))
+        changes = []
+        
+        # Optional server-side filters
+        doctor_id = request.args.get('doctor_id', type=int)
+        if doctor_id:
+            query = query.filter(Visit.doctor_id == doctor_id)
+            changes.append(VisitChangeLog.doctor_id == doctor_id)
+        department_id = request.args.get('department_id', type=int)
+        if department_id:
+            query = query.filter(Doctor.department_id == department_id)
+        status = request.args.get('status')
+        if status:
+            query = query.filter(Visit.status.in_(status.split(',')))
+        date_from = date_arg('date_from')
+        if date_from:
+            query = query.filter(Visit.visit_date >= date_from)
+            changes.append(VisitChangeLog.visit_date >= date_from)
+        date_to = date_arg('date_to')
+        if date_to:
+            query = query.filter(Visit.visit_date <= date_to)
+            changes.append(VisitChangeLog.visit_date <= date_to)
+        
+        # ?since=<token>: only what changed since the previous response
+        since = request.args.get('since')
+        if since:
+            return delta_sync.sync_response(since, query, *changes, include_admin_notes=True, fields=fields), 200
+        
+        # Paged clients keep the token of their first page
+        token = delta_sync.current_token()
+        response = make_response(keyset_response(
+            query,
+            [Visit.visit_date, Visit.id],
+            lambda row: Visit.row_to_dict(row, True, fields),
+            encoder=Visit.json_columns(True, fields)
+        ))
+        response.headers[delta_sync.TOKEN_HEADER] = token
+        return response
+    except delta_sync.TokenExpired:
+        return jsonify({'error': 'Sync token expired; reload the full list'}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @central_bp.route('/visits', methods=['POST'])
-@jwt_required()
+@role_required('central')
 def create_visit():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         data = request.get_json()
         
         # Get next queue number for the doctor on this date
         today = date.today()
-        last_queue = Visit.query.filter_by(
-            doctor_id=data.get('doctor_id'),
-            visit_date=today
-        ).order_by(Visit.queue_number.desc()).first()
-        
-        next_queue_number = (last_queue.queue_number + 1) if last_queue else 1
+        next_queue_number = allocate_queue_number(data.get('doctor_id'), today)
         
         visit = Visit(
             patient_id=data.get('patient_id'),
             doctor_id=data.get('doctor_id'),
             queue_number=next_queue_number,
+            visit_date=today,
             description=data.get('description', ''),
             admin_notes=data.get('admin_notes', '')
         )
@@ -277,67 +305,112 @@ def create_visit():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@central_bp.route('/visits/bulk', methods=['POST'])
+@role_required('central')
+def bulk_create_visits():
+    """Check in many patients at once from NDJSON or a JSON array of {patient_id, doctor_id}"""
+    try:
+        report = check_in_visits(iter_records(request))
+        return jsonify(report.to_dict()), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @central_bp.route('/visits/<int:visit_id>', methods=['PUT'])
-@jwt_required()
+@role_required('central')
 def update_visit(visit_id):
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
-        visit = Visit.query.get_or_404(visit_id)
         data = request.get_json()
         
-        visit.status = data.get('status', visit.status)
-        visit.description = data.get('description', visit.description)
-        visit.admin_notes = data.get('admin_notes', visit.admin_notes)
-        
-        if data.get('status') == 'completed' and not visit.completed_at:
-            visit.completed_at = datetime.utcnow()
-        
-        visit.updated_at = datetime.utcnow()
+        def write():
+            # Everything to_dict() needs in one query
+            visit = db.session.get(Visit, visit_id, options=[
+                joinedload(Visit.patient), joinedload(Visit.doctor).joinedload(Doctor.department)
+            ])
+            if not visit:
+                return {'error': 'Visit not found'}, 404
+            
+            visit.status = data.get('status', visit.status)
+            visit.description = data.get('description', visit.description)
+            visit.admin_notes = data.get('admin_notes', visit.admin_notes)
+            
+            if data.get('status') == 'completed' and not visit.completed_at:
+                visit.completed_at = datetime.utcnow()
+            
+            visit.updated_at = datetime.utcnow()
+            return visit.to_dict(include_admin_notes=True), 200
         
-        db.session.commit()
-        return jsonify(visit.to_dict(include_admin_notes=True)), 200
+        body, status = group_commit.run(write)
+        return jsonify(body), status
+    except WriterOverloaded:
+        return jsonify({'error': 'Too many updates in progress, please retry shortly'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Statistics
 @central_bp.route('/visits/stats', methods=['GET'])
-@jwt_required()
+@role_required('central')
 def get_visit_stats():
-    auth_check = require_central_role()
-    if auth_check:
-        return auth_check
-    
     try:
         today = date.today()
         
-        # Average waiting time per doctor (simplified calculation)
-        doctors_stats = db.session.query(
-            Doctor.id,
-            Doctor.name,
-            func.count(Visit.id).label('total_visits'),
-            func.avg(Visit.rating).label('avg_rating'),
-            func.count(Visit.id).filter(Visit.status == 'waiting').label('waiting_count')
-        ).join(Visit).filter(Visit.visit_date == today).group_by(Doctor.id).all()
+        # Totals are maintained incrementally as visits change (see services/doctor_stats.py)
+        doctors_stats = db.session.query(DoctorDailyStats, Doctor.name).join(
+            Doctor, Doctor.id == DoctorDailyStats.doctor_id
+        ).filter(DoctorDailyStats.visit_date == today, DoctorDailyStats.total_visits > 0).all()
         
         stats = []
-        for stat in doctors_stats:
-            # Estimate average waiting time (simplified: 15 minutes per waiting patient)
-            avg_waiting_time = stat.waiting_count * 15 if stat.waiting_count else 0
+        for stat, doctor_name in doctors_stats:
+            # Estimate waiting time from the doctor's history and today's pace (see services/wait_times.py)
+            minutes_per_patient = wait_time_model.minutes_per_patient(stat.doctor_id)
+            avg_waiting_time = wait_time_model.estimate_minutes(stat.doctor_id, stat.waiting_count)
             
             stats.append({
-                'doctor_id': stat.id,
-                'doctor_name': stat.name,
+                'doctor_id': stat.doctor_id,
+                'doctor_name': doctor_name,
                 'total_visits_today': stat.total_visits,
-                'average_rating': round(stat.avg_rating, 2) if stat.avg_rating else None,
+                'average_rating': round(stat.average_rating, 2) if stat.average_rating else None,
                 'current_waiting_count': stat.waiting_count,
-                'estimated_waiting_time_minutes': avg_waiting_time
+                'estimated_waiting_time_minutes': avg_waiting_time,
+                'minutes_per_patient': round(minutes_per_patient, 1),
+                'completed_count': stat.completed_count,
+                'in_progress_count': stat.in_progress_count,
+                'cancelled_count': stat.cancelled_count
             })
         
         return jsonify(stats), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+# Analytics over the whole visit history (see services/analytics.py)
+@central_bp.route('/analytics/<report>', methods=['GET'])
+@role_required('central')
+def get_analytics(report):
+    """Aggregates of visits, arrivals, ratings or throughput.
+
+    Query arguments: date_from/date_to (YYYY-MM-DD, default the last 90
+    days), group_by (comma separated: doctor, department, day, week,
+    month, weekday, hour, status), doctor_id and department_id.
+    """
+    try:
+        if report not in analytics.REPORTS:
+            return jsonify({'error': f"Unknown report; expected one of {', '.join(analytics.REPORTS)}"}), 404
+        
+        columns = analytics.snapshot.current(current_app.config['ANALYTICS_REFRESH_SECONDS'])
+        return jsonify(analytics.report(
+            columns,
+            report,
+            group_by=request.args.get('group_by'),
+            date_from=date_arg('date_from'),
+            date_to=date_arg('date_to'),
+            doctor_id=request.args.get('doctor_id', type=int),
+            department_id=request.args.get('department_id', type=int)
+        )), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
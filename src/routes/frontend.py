@@ -1,17 +1,18 @@
-from flask import Blueprint, send_from_directory, current_app
+from flask import Blueprint
+from src.services.static_assets import manifest
 import os
 
 frontend_bp = Blueprint('frontend', __name__)
 
+@frontend_bp.record_once
+def build_manifest(state):
+    """Read and compress the static folder once, when the blueprint is registered"""
+    manifest.build(os.path.join(state.app.root_path, 'static'))
+
 @frontend_bp.route('/')
 @frontend_bp.route('/<path:path>')
 def serve_frontend(path=''):
     """Serve the React frontend"""
-    static_folder = os.path.join(current_app.root_path, 'static')
-    
-    # If path is empty or doesn't exist, serve index.html
-    if not path or not os.path.exists(os.path.join(static_folder, path)):
-        return send_from_directory(static_folder, 'index.html')
-    
-    return send_from_directory(static_folder, path)
-
+    # Unknown paths are client-side routes: serve index.html
+    asset = manifest.get(path) if path else None
+    return manifest.response(asset or manifest.get('index.html'))
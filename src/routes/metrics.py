@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from src.services import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and SQL metrics of this process in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
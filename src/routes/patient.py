@@ -1,8 +1,19 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.patient import Patient
+from src.models.doctor import Doctor
 from src.models.visit import Visit
+from src.models.visit_archive import patient_history
+from src.services.group_commit import group_commit, WriterOverloaded
+from src.services.live_queue import live_queue
+from src.services.pagination import keyset_page, fields_arg
+from src.services.wait_times import wait_time_model
+from src.services.patient_search import search_by_name, MAX_RESULTS
+from src.services.queue_stream import (
+    HubFull, sse_response, queue_state, visit_position, doctor_channel, visit_channel
+)
 from datetime import date, datetime
+from sqlalchemy.orm import joinedload, load_only
 
 patient_bp = Blueprint('patient', __name__)
 
@@ -16,22 +27,21 @@ def get_queue_status():
             return jsonify({'error': 'Phone number or name is required'}), 400
         
         # Find patient by phone or name
-        query = Patient.query
         if phone:
-            query = query.filter_by(phone=phone)
-        elif name:
-            query = query.filter(Patient.name.ilike(f'%{name}%'))
+            patient = Patient.query.filter_by(phone=phone).first()
+        else:
+            matches = search_by_name(name, limit=1)
+            patient = matches[0] if matches else None
         
-        patient = query.first()
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
         
         # Get current active visit (today's visit that's not completed)
         today = date.today()
-        current_visit = Visit.query.filter_by(
-            patient_id=patient.id,
-            visit_date=today
-        ).filter(Visit.status.in_(['waiting', 'in_progress'])).first()
+        visit_id = live_queue.active_visit_id(patient.id, today)
+        current_visit = db.session.get(Visit, visit_id, options=[
+            joinedload(Visit.doctor).joinedload(Doctor.department)
+        ]) if visit_id else None
         
         if not current_visit:
             return jsonify({
@@ -42,14 +52,17 @@ def get_queue_status():
             }), 200
         
         # Calculate queue position (how many people are ahead)
-        ahead_count = Visit.query.filter_by(
-            doctor_id=current_visit.doctor_id,
-            visit_date=today,
-            status='waiting'
-        ).filter(Visit.queue_number < current_visit.queue_number).count()
-        
-        # Estimate waiting time (15 minutes per person ahead)
-        estimated_waiting_time = ahead_count * 15
+        ahead_count = live_queue.ahead_of(current_visit.id, today)
+        if ahead_count is None:
+            # The in-memory queue was reloaded between the two lookups
+            ahead_count = Visit.query.filter_by(
+                doctor_id=current_visit.doctor_id,
+                visit_date=today,
+                status='waiting'
+            ).filter(Visit.queue_number < current_visit.queue_number).count()
+        
+        # Estimate waiting time from the doctor's usual and current pace
+        estimated_waiting_time = wait_time_model.estimate_minutes(current_visit.doctor_id, ahead_count)
         
         return jsonify({
             'patient': patient.to_dict(),
@@ -61,29 +74,69 @@ def get_queue_status():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@patient_bp.route('/queue/stream', methods=['GET'])
+def stream_visit_position():
+    """Server-sent events with the queue position of one visit"""
+    try:
+        visit_id = request.args.get('visit_id', type=int)
+        if not visit_id:
+            return jsonify({'error': 'visit_id is required'}), 400
+        
+        visit = db.session.get(Visit, visit_id)
+        if not visit:
+            return jsonify({'error': 'Visit not found'}), 404
+        
+        ahead = None
+        if visit.visit_date == date.today() and visit.status in ('waiting', 'in_progress'):
+            ahead = live_queue.ahead_of(visit.id, visit.visit_date)
+        
+        return sse_response(visit_channel(visit.id), [
+            ('position', visit_position(visit.id, visit.status, ahead))
+        ])
+        
+    except HubFull:
+        return jsonify({'error': 'Too many open streams, please poll instead'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('/queue/doctors/<int:doctor_id>/stream', methods=['GET'])
+def stream_doctor_queue(doctor_id):
+    """Server-sent events with today's waiting queue numbers of a doctor"""
+    try:
+        today = date.today()
+        live_queue.ensure_loaded(today)
+        return sse_response(doctor_channel(doctor_id, today), [
+            ('queue', queue_state(doctor_id, today))
+        ])
+        
+    except HubFull:
+        return jsonify({'error': 'Too many open streams, please poll instead'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @patient_bp.route('/visits/<int:patient_id>', methods=['GET'])
 def get_patient_visits(patient_id):
     try:
         patient = Patient.query.get_or_404(patient_id)
-        visits = Visit.query.filter_by(patient_id=patient_id).order_by(Visit.created_at.desc()).all()
+        # Live and archived visits, newest first; ?limit= pages with next_cursor,
+        # ?fields= limits the visit columns read and returned
+        fields = fields_arg(Visit.FIELDS)
+        rows, next_cursor = keyset_page(patient_history(patient_id, fields), [Visit.created_at, Visit.id], descending=True)
         
         return jsonify({
             'patient': patient.to_dict(),
-            'visits': [visit.to_dict() for visit in visits]
+            'visits': Visit.serialize(rows, fields=fields),
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @patient_bp.route('/visits/<int:visit_id>/rating', methods=['PUT'])
 def rate_visit(visit_id):
     try:
-        visit = Visit.query.get_or_404(visit_id)
-        
-        # Only allow rating completed visits
-        if visit.status != 'completed':
-            return jsonify({'error': 'Can only rate completed visits'}), 400
-        
         data = request.get_json()
         rating = data.get('rating')
         patient_notes = data.get('patient_notes', '')
@@ -91,13 +144,28 @@ def rate_visit(visit_id):
         if not rating or rating < 1 or rating > 5:
             return jsonify({'error': 'Rating must be between 1 and 5'}), 400
         
-        visit.rating = rating
-        visit.patient_notes = patient_notes
-        visit.updated_at = datetime.utcnow()
-        
-        db.session.commit()
-        return jsonify(visit.to_dict()), 200
-        
+        def write():
+            # Everything to_dict() needs in one query
+            visit = db.session.get(Visit, visit_id, options=[
+                joinedload(Visit.patient), joinedload(Visit.doctor).joinedload(Doctor.department)
+            ])
+            if not visit:
+                return {'error': 'Visit not found'}, 404
+            
+            # Only allow rating completed visits
+            if visit.status != 'completed':
+                return {'error': 'Can only rate completed visits'}, 400
+            
+            visit.rating = rating
+            visit.patient_notes = patient_notes
+            visit.updated_at = datetime.utcnow()
+            return visit.to_dict(), 200
+        
+        body, status = group_commit.run(write)
+        return jsonify(body), status
+        
+    except WriterOverloaded:
+        return jsonify({'error': 'Too many updates in progress, please retry shortly'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -111,17 +179,23 @@ def search_patient():
         if not phone and not name:
             return jsonify({'error': 'Phone number or name is required'}), 400
         
-        # Find patient by phone or name
-        query = Patient.query
+        # Find patients by phone or name, one page at a time; ?fields= limits the columns
+        fields = fields_arg(Patient.FIELDS)
+        limit = request.args.get('limit', 50, type=int)
+        offset = request.args.get('offset', 0, type=int)
         if phone:
-            query = query.filter_by(phone=phone)
-        elif name:
-            query = query.filter(Patient.name.ilike(f'%{name}%'))
-        
-        patients = query.all()
-        
-        return jsonify([patient.to_dict() for patient in patients]), 200
-        
+            query = Patient.query.filter_by(phone=phone)
+            if fields is not None:
+                query = query.options(load_only(*[getattr(Patient, name) for name in fields]))
+            patients = query.order_by(Patient.id).limit(max(1, min(limit, MAX_RESULTS))) \
+                .offset(max(0, offset)).all()
+        else:
+            patients = search_by_name(name, limit=limit, offset=offset, fields=fields)
+        
+        return jsonify([patient.to_dict(fields) for patient in patients]), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
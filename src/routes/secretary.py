@@ -1,55 +1,57 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import db, User
+from flask import Blueprint, current_app, request, jsonify, g
+from src.models.user import db
 from src.models.doctor import Doctor
 from src.models.patient import Patient
 from src.models.visit import Visit
+from src.models.visit_archive import patient_history
+from src.models.visit_change_log import VisitChangeLog
+from src.services.authorization import role_required
+from src.services.bulk_import import iter_records, check_in_visits
+from src.services.group_commit import group_commit, WriterOverloaded
+from src.services.pagination import keyset_page, fields_arg
+from src.services import delta_sync, queue_actions
+from src.services.queue_numbers import allocate_queue_number
+from src.services.live_queue import live_queue
+from src.services.queue_stream import HubFull, sse_response, queue_state, doctor_channel
+from src.services.reference_cache import cached_json
 from datetime import datetime, date
+from sqlalchemy.orm import joinedload
 
 secretary_bp = Blueprint('secretary', __name__)
 
-def require_secretary_role():
-    """Decorator to ensure user has secretary role"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user or user.role != 'secretary':
-        return jsonify({'error': 'Access denied. Secretary role required.'}), 403
-    return user
-
 # Patient management for secretary
 @secretary_bp.route('/patients/search', methods=['GET'])
-@jwt_required()
+@role_required('secretary')
 def search_patient():
-    user = require_secretary_role()
-    if isinstance(user, tuple):  # Error response
-        return user
-    
     try:
         social_id = request.args.get('social_id')
         if not social_id:
             return jsonify({'error': 'Social ID is required'}), 400
         
+        # ?fields= limits the visit columns read and returned
+        fields = fields_arg(Visit.FIELDS)
         patient = Patient.query.filter_by(social_id=social_id).first()
         if patient:
-            # Get patient's visit history
-            visits = Visit.query.filter_by(patient_id=patient.id).order_by(Visit.created_at.desc()).all()
+            # Get patient's visit history, live and archived; ?limit= pages with next_cursor
+            rows, next_cursor = keyset_page(
+                patient_history(patient.id, fields), [Visit.created_at, Visit.id], descending=True
+            )
             return jsonify({
                 'patient': patient.to_dict(),
-                'visits': [visit.to_dict() for visit in visits]
+                'visits': Visit.serialize(rows, fields=fields),
+                'next_cursor': next_cursor
             }), 200
         else:
-            return jsonify({'patient': None, 'visits': []}), 200
+            return jsonify({'patient': None, 'visits': [], 'next_cursor': None}), 200
             
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @secretary_bp.route('/patients', methods=['POST'])
-@jwt_required()
+@role_required('secretary')
 def create_patient():
-    user = require_secretary_role()
-    if isinstance(user, tuple):  # Error response
-        return user
-    
     try:
         data = request.get_json()
         
@@ -73,11 +75,9 @@ def create_patient():
 
 # Visit management for secretary
 @secretary_bp.route('/visits', methods=['GET'])
-@jwt_required()
+@role_required('secretary')
 def get_visits():
-    user = require_secretary_role()
-    if isinstance(user, tuple):  # Error response
-        return user
+    user = g.current_user
     
     try:
         # Get visits for the secretary's assigned doctor
@@ -85,21 +85,61 @@ def get_visits():
             return jsonify({'error': 'Secretary not assigned to any doctor'}), 400
         
         today = date.today()
-        visits = Visit.query.filter_by(
-            doctor_id=user.doctor_id,
-            visit_date=today
-        ).order_by(Visit.queue_number).all()
+        # ?fields= reads and returns only the named columns (the queue screen needs a handful)
+        fields = fields_arg(Visit.FIELDS)
+        query = Visit.serialized_query(fields).filter(
+            Visit.doctor_id == user.doctor_id,
+            Visit.visit_date == today
+        )
+        
+        # ?since=<token>: only what changed since the previous response
+        since = request.args.get('since')
+        if since:
+            return delta_sync.sync_response(
+                since, query, VisitChangeLog.doctor_id == user.doctor_id, VisitChangeLog.visit_date == today,
+                fields=fields
+            ), 200
+        
+        token = delta_sync.current_token()
+        visits = Visit.serialize_json(query.order_by(Visit.queue_number), fields=fields)
+        
+        return current_app.response_class(visits + '\n', mimetype='application/json'), 200, {
+            delta_sync.TOKEN_HEADER: token
+        }
+    except delta_sync.TokenExpired:
+        return jsonify({'error': 'Sync token expired; reload the full list'}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@secretary_bp.route('/visits/stream', methods=['GET'])
+@role_required('secretary')
+def stream_visits():
+    """Server-sent events for every change to today's queue of the assigned doctor.
+
+    EventSource cannot set headers, so the token may be passed as ?jwt=<token>.
+    """
+    user = g.current_user
+    
+    try:
+        if not user.doctor_id:
+            return jsonify({'error': 'Secretary not assigned to any doctor'}), 400
         
-        return jsonify([visit.to_dict() for visit in visits]), 200
+        today = date.today()
+        live_queue.ensure_loaded(today)
+        return sse_response(doctor_channel(user.doctor_id, today), [
+            ('queue', queue_state(user.doctor_id, today))
+        ])
+    except HubFull:
+        return jsonify({'error': 'Too many open streams, please poll instead'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @secretary_bp.route('/visits', methods=['POST'])
-@jwt_required()
+@role_required('secretary')
 def create_visit():
-    user = require_secretary_role()
-    if isinstance(user, tuple):  # Error response
-        return user
+    user = g.current_user
     
     try:
         if not user.doctor_id:
@@ -114,17 +154,13 @@ def create_visit():
         
         # Get next queue number for the doctor on this date
         today = date.today()
-        last_queue = Visit.query.filter_by(
-            doctor_id=user.doctor_id,
-            visit_date=today
-        ).order_by(Visit.queue_number.desc()).first()
-        
-        next_queue_number = (last_queue.queue_number + 1) if last_queue else 1
+        next_queue_number = allocate_queue_number(user.doctor_id, today)
         
         visit = Visit(
             patient_id=data.get('patient_id'),
             doctor_id=user.doctor_id,
             queue_number=next_queue_number,
+            visit_date=today,
             description=data.get('description', '')
         )
         db.session.add(visit)
@@ -134,53 +170,137 @@ def create_visit():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@secretary_bp.route('/visits/bulk', methods=['POST'])
+@role_required('secretary')
+def bulk_create_visits():
+    """Check in many patients with the assigned doctor from NDJSON or a JSON array of {patient_id}"""
+    user = g.current_user
+    
+    try:
+        if not user.doctor_id:
+            return jsonify({'error': 'Secretary not assigned to any doctor'}), 400
+        
+        report = check_in_visits(iter_records(request), doctor_id=user.doctor_id)
+        return jsonify(report.to_dict()), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @secretary_bp.route('/visits/<int:visit_id>', methods=['PUT'])
-@jwt_required()
+@role_required('secretary')
 def update_visit(visit_id):
-    user = require_secretary_role()
-    if isinstance(user, tuple):  # Error response
-        return user
+    doctor_id = g.current_user.doctor_id
     
     try:
-        visit = Visit.query.get_or_404(visit_id)
+        data = request.get_json()
         
-        # Ensure the visit belongs to the secretary's doctor
-        if visit.doctor_id != user.doctor_id:
-            return jsonify({'error': 'Access denied. Visit does not belong to your doctor.'}), 403
+        def write():
+            # Everything to_dict() needs in one query
+            visit = db.session.get(Visit, visit_id, options=[
+                joinedload(Visit.patient), joinedload(Visit.doctor).joinedload(Doctor.department)
+            ])
+            if not visit:
+                return {'error': 'Visit not found'}, 404
+            
+            # Ensure the visit belongs to the secretary's doctor
+            if visit.doctor_id != doctor_id:
+                return {'error': 'Access denied. Visit does not belong to your doctor.'}, 403
+            
+            visit.status = data.get('status', visit.status)
+            visit.description = data.get('description', visit.description)
+            
+            if data.get('status') == 'completed' and not visit.completed_at:
+                visit.completed_at = datetime.utcnow()
+            
+            visit.updated_at = datetime.utcnow()
+            return visit.to_dict(), 200
         
-        data = request.get_json()
+        body, status = group_commit.run(write)
+        return jsonify(body), status
+    except WriterOverloaded:
+        return jsonify({'error': 'Too many updates in progress, please retry shortly'}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@secretary_bp.route('/visits/advance', methods=['POST'])
+@role_required('secretary')
+def advance_queue():
+    """Call next: complete the visit in progress and call in the lowest waiting queue number"""
+    user = g.current_user
+    
+    try:
+        if not user.doctor_id:
+            return jsonify({'error': 'Secretary not assigned to any doctor'}), 400
         
-        visit.status = data.get('status', visit.status)
-        visit.description = data.get('description', visit.description)
+        completed_ids, current_id = queue_actions.advance_queue(user.doctor_id)
+        rows = Visit.serialize(Visit.serialized_query().filter(Visit.id.in_([*completed_ids, current_id])))
+        db.session.commit()
         
-        if data.get('status') == 'completed' and not visit.completed_at:
-            visit.completed_at = datetime.utcnow()
+        by_id = {visit['id']: visit for visit in rows}
+        return jsonify({
+            'completed': [by_id[visit_id] for visit_id in completed_ids],
+            'current': by_id.get(current_id)
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@secretary_bp.route('/visits/status', methods=['POST'])
+@role_required('secretary')
+def bulk_update_status():
+    """Set the status of today's visits in one UPDATE.
+
+    Body: {"status": "cancelled", "from_status": ["waiting"], "visit_ids": [...]}; from_status
+    defaults to waiting and visit_ids to every matching visit of the assigned doctor.
+    """
+    user = g.current_user
+    
+    try:
+        if not user.doctor_id:
+            return jsonify({'error': 'Secretary not assigned to any doctor'}), 400
         
-        visit.updated_at = datetime.utcnow()
+        data = request.get_json() or {}
+        status = data.get('status')
+        if not status:
+            return jsonify({'error': 'status is required'}), 400
+        from_statuses = data.get('from_status', ['waiting'])
+        if isinstance(from_statuses, str):
+            from_statuses = [from_statuses]
+        visit_ids = data.get('visit_ids')
+        if visit_ids is not None and not all(isinstance(visit_id, int) for visit_id in visit_ids):
+            return jsonify({'error': 'visit_ids must be a list of integers'}), 400
         
+        updated = queue_actions.set_status(user.doctor_id, status, from_statuses, visit_ids)
         db.session.commit()
-        return jsonify(visit.to_dict()), 200
+        return jsonify({'updated': len(updated), 'visit_ids': updated}), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Get doctor information
 @secretary_bp.route('/doctor', methods=['GET'])
-@jwt_required()
+@role_required('secretary')
 def get_doctor_info():
-    user = require_secretary_role()
-    if isinstance(user, tuple):  # Error response
-        return user
+    user = g.current_user
     
     try:
         if not user.doctor_id:
             return jsonify({'error': 'Secretary not assigned to any doctor'}), 400
         
-        doctor = Doctor.query.get(user.doctor_id)
-        if not doctor:
-            return jsonify({'error': 'Assigned doctor not found'}), 404
+        def load_doctor():
+            doctor = db.session.get(Doctor, user.doctor_id, options=[joinedload(Doctor.department)])
+            return doctor.to_dict() if doctor else None
         
-        return jsonify(doctor.to_dict()), 200
+        response = cached_json('doctors', user.doctor_id, load_doctor)
+        if response is None:
+            return jsonify({'error': 'Assigned doctor not found'}), 404
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,124 @@
+"""Production server.
+
+Runs the app under gunicorn: the database bootstrap happens once in the
+master before the workers are forked (preloading), each worker then loads
+its own per-process state, serves requests on a pool of threads, and is
+recycled after a number of requests.
+
+An open event stream (the /stream routes) holds a request thread for as
+long as the client stays connected. Each worker therefore runs WEB_THREADS
+threads for API requests plus WEB_STREAMS threads for streams, and accepts
+at most WEB_STREAMS streams. Further streams get a 503 and the client
+polls instead, so idle queue screens can never take the threads that API
+requests need. An idle stream costs about 35kB including its thread. The
+server holds at most WEB_WORKERS x WEB_STREAMS streams; raise WEB_STREAMS
+for more. SIGTERM lets in-flight requests finish
+for up to WEB_GRACEFUL_TIMEOUT seconds; open event streams are closed and
+browsers reconnect on their own.
+
+    python src/serve.py
+
+Settings come from the environment:
+
+    HOST, PORT                  bind address (default 0.0.0.0:5000)
+    WEB_WORKERS                 worker processes (default: CPU count, at most 8)
+    WEB_THREADS                 request threads per worker for API requests (default 8)
+    WEB_STREAMS                 event streams per worker, each on a thread of its own (default 64)
+    WEB_TIMEOUT                 seconds before a stuck worker is restarted (default 60)
+    WEB_GRACEFUL_TIMEOUT        seconds allowed for in-flight requests on shutdown (default 30)
+    WEB_MAX_REQUESTS            recycle a worker after this many requests, 0 = never (default 10000)
+    WEB_MAX_REQUESTS_JITTER     random extra requests so workers do not recycle together (default 1000)
+
+gunicorn is only needed here; without it (e.g. on Windows) the app is
+served by Werkzeug's threaded server in a single process.
+"""
+import os
+import sys
+
+# Allow running as a script from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # optional
+    BaseApplication = None
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def server_options():
+    """gunicorn settings from the environment"""
+    # Streams get threads of their own on top of the API threads; the app
+    # reads WEB_STREAMS too and refuses streams beyond it
+    threads = _env_int('WEB_THREADS', 8) + _env_int('WEB_STREAMS', 64)
+    return {
+        'bind': f"{os.environ.get('HOST', '0.0.0.0')}:{_env_int('PORT', 5000)}",
+        'workers': _env_int('WEB_WORKERS', min(os.cpu_count() or 1, 8)),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': _env_int('WEB_TIMEOUT', 60),
+        'graceful_timeout': _env_int('WEB_GRACEFUL_TIMEOUT', 30),
+        'max_requests': _env_int('WEB_MAX_REQUESTS', 10000),
+        'max_requests_jitter': _env_int('WEB_MAX_REQUESTS_JITTER', 1000),
+        'preload_app': True,
+        'post_fork': _post_fork,
+        'accesslog': '-',
+    }
+
+
+def _post_fork(server, worker):
+    from src.main import init_worker
+    init_worker()
+
+
+def load_app():
+    """Import the app and run the one-time bootstrap in this (master) process.
+
+    The wait-time model is trained and the analytics snapshot built here
+    too, so every worker inherits them instead of each reading the whole
+    visit history after the fork.
+    """
+    from src.main import create_app
+    from src.models.user import db
+    from src.services import analytics
+    from src.services.wait_times import wait_time_model
+    app = create_app(bootstrap=True, worker=False)
+    with app.app_context():
+        wait_time_model.train()
+        analytics.snapshot.refresh()
+        db.engine.dispose()
+    return app
+
+
+if BaseApplication is not None:
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app()
+
+
+def main():
+    options = server_options()
+    if BaseApplication is not None:
+        Server(options).run()
+        return
+
+    print("gunicorn is not installed; serving from a single process")
+    from src.main import create_app
+    app = create_app()
+    host, port = options['bind'].rsplit(':', 1)
+    app.run(host=host, port=int(port), threaded=True, debug=False, use_reloader=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+import itertools
+import threading
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import case, func, select, union_all
+from src.models.user import db
+from src.models.department import Department
+from src.models.doctor import Doctor
+from src.models.visit import Visit
+from src.models.visit_archive import VisitArchive
+from src.services.wait_times import epoch_seconds
+
+STATUSES = ('waiting', 'in_progress', 'completed', 'cancelled', 'no_show')
+_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+# Visits still waiting or in progress after their day are counted as no-shows
+NO_SHOW = _STATUS_CODES['no_show']
+
+DIMENSIONS = ('doctor', 'department', 'day', 'week', 'month', 'weekday', 'hour', 'status')
+MAX_DIMENSIONS = 3
+DEFAULT_RANGE_DAYS = 90
+
+# Rows updated this long before the last refresh are read again, so a
+# transaction that committed late with an older updated_at is not missed.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+_EPOCH = date(1970, 1, 1)
+
+
+def day_number(value):
+    return (value - _EPOCH).days
+
+
+class _Columns:
+    """One immutable generation of the snapshot; refreshes build a new one"""
+    __slots__ = ('id', 'doctor', 'day', 'hour', 'status', 'rating', 'service', 'department_of',
+                 'doctor_names', 'department_names')
+
+    def __len__(self):
+        return len(self.id)
+
+
+_ARRAYS = ('id', 'doctor', 'day', 'hour', 'status', 'rating', 'service')
+
+
+def _extract(models, updated_since=None):
+    """Visit rows as int64 columns: id, doctor, day, check-in time, status, rating, service seconds"""
+    selects = []
+    for model in models:
+        query = select(
+            model.id,
+            model.doctor_id,
+            func.coalesce(epoch_seconds(model.visit_date), 0),
+            func.coalesce(epoch_seconds(model.created_at), 0),
+            case(_STATUS_CODES, value=model.status, else_=_STATUS_CODES['waiting']),
+            func.coalesce(model.rating, 0),
+            func.coalesce(epoch_seconds(model.completed_at) - epoch_seconds(model.created_at), -1),
+        )
+        if updated_since is not None:
+            query = query.where(model.updated_at >= updated_since)
+        selects.append(query)
+
+    rows = db.session.execute(union_all(*selects) if len(selects) > 1 else selects[0]).all()
+    data = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=7 * len(rows))
+    return data.reshape(-1, 7)
+
+
+class VisitSnapshot:
+    """Columnar copy of visit history (live and archived) for analytics.
+
+    Every visit is a row of compact NumPy arrays: doctor, visit day, hour
+    of check-in (UTC), status, rating and service time. Aggregations run
+    as vectorized group-bys over these arrays instead of SQL GROUP BYs or
+    ORM loops. The first use reads everything; later refreshes only read
+    visits whose updated_at moved, and merge them by id. Doctor and
+    department names and the doctor -> department mapping are reloaded on
+    every refresh, so reassigning a doctor is reflected immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = None
+        self._updated_until = None
+        self._refreshed = None
+
+    def current(self, max_age):
+        """The snapshot, refreshed first if it is older than ``max_age`` seconds"""
+        if self._columns is None or time.monotonic() - self._refreshed > max_age:
+            with self._lock:
+                if self._columns is None or time.monotonic() - self._refreshed > max_age:
+                    self.refresh()
+        return self._columns
+
+    def ensure_built(self):
+        """Read the full history now unless a snapshot exists (e.g. inherited from the master)"""
+        if self._columns is None:
+            with self._lock:
+                if self._columns is None:
+                    self.refresh()
+
+    def refresh(self):
+        started = time.monotonic()
+        # Rows committed from now on have a later updated_at, apart from
+        # transactions already running, which REFRESH_OVERLAP covers
+        updated_until = datetime.utcnow()
+        if self._columns is None:
+            data = _extract((Visit, VisitArchive))
+            # A visit is briefly in both tables while it is being archived
+            data = data[np.unique(data[:, 0], return_index=True)[1]]
+            columns = self._build(data)
+        else:
+            data = _extract((Visit,), self._updated_until - REFRESH_OVERLAP)
+            columns = self._merge(self._columns, data)
+
+        self._load_reference(columns)
+        self._columns = columns
+        self._updated_until = updated_until
+        self._refreshed = started
+        return len(data)
+
+    def _build(self, data):
+        columns = _Columns()
+        columns.id = data[:, 0].copy()
+        columns.doctor = data[:, 1].astype(np.int32)
+        columns.day = (data[:, 2] // 86400).astype(np.int32)
+        columns.hour = (data[:, 3] % 86400 // 3600).astype(np.int8)
+        columns.status = data[:, 4].astype(np.int8)
+        columns.rating = data[:, 5].astype(np.int8)
+        columns.service = np.where(data[:, 6] >= 0, data[:, 6], np.nan).astype(np.float32)
+        return columns
+
+    def _merge(self, old, data):
+        """``old`` with the rows of ``data`` replaced or added, ordered by id"""
+        merged = _Columns()
+        if not len(data):
+            for name in _ARRAYS:
+                setattr(merged, name, getattr(old, name))
+            return merged
+        data = data[np.unique(data[:, 0], return_index=True)[1]]
+        changed = self._build(data)
+        positions = np.searchsorted(old.id, changed.id)
+        existing = positions < len(old.id)
+        existing[existing] = old.id[positions[existing]] == changed.id[existing]
+
+        added = ~existing
+        for name in _ARRAYS:
+            values = getattr(old, name).copy()
+            values[positions[existing]] = getattr(changed, name)[existing]
+            setattr(merged, name, np.concatenate([values, getattr(changed, name)[added]]))
+        if added.any():
+            order = np.argsort(merged.id, kind='stable')
+            for name in _ARRAYS:
+                setattr(merged, name, getattr(merged, name)[order])
+        return merged
+
+    def _load_reference(self, columns):
+        doctors = db.session.execute(select(Doctor.id, Doctor.name, Doctor.department_id)).all()
+        size = max([doctor.id for doctor in doctors] + [int(columns.doctor.max()) if len(columns) else 0]) + 1
+        department_of = np.full(size, -1, dtype=np.int32)
+        for doctor in doctors:
+            department_of[doctor.id] = doctor.department_id if doctor.department_id is not None else -1
+        columns.department_of = department_of
+        columns.doctor_names = {doctor.id: doctor.name for doctor in doctors}
+        columns.department_names = dict(db.session.execute(select(Department.id, Department.name)).all())
+
+
+def _week_start(day):
+    # Day 0 (1970-01-01) was a Thursday; weeks start on Monday
+    return day - (day + 3) % 7
+
+
+def _dimension_keys(columns, dimension, rows, today):
+    """Integer key of every selected row for one grouping dimension"""
+    if dimension == 'doctor':
+        return columns.doctor[rows].astype(np.int64)
+    if dimension == 'department':
+        return columns.department_of[columns.doctor[rows]].astype(np.int64)
+    day = columns.day[rows].astype(np.int64)
+    if dimension == 'day':
+        return day
+    if dimension == 'week':
+        return _week_start(day)
+    if dimension == 'month':
+        return day.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if dimension == 'weekday':
+        return (day + 3) % 7
+    if dimension == 'hour':
+        return columns.hour[rows].astype(np.int64)
+    return _effective_status(columns, rows, today).astype(np.int64)
+
+
+def _effective_status(columns, rows, today):
+    status = columns.status[rows]
+    open_ = (status == _STATUS_CODES['waiting']) | (status == _STATUS_CODES['in_progress'])
+    return np.where(open_ & (columns.day[rows] < day_number(today)), NO_SHOW, status)
+
+
+def _label(columns, dimension, key):
+    key = int(key)
+    if dimension == 'doctor':
+        return {'doctor_id': key, 'doctor_name': columns.doctor_names.get(key)}
+    if dimension == 'department':
+        if key < 0:
+            return {'department_id': None, 'department_name': None}
+        return {'department_id': key, 'department_name': columns.department_names.get(key)}
+    if dimension in ('day', 'week'):
+        return {dimension: (_EPOCH + timedelta(days=key)).isoformat()}
+    if dimension == 'month':
+        return {'month': f'{1970 + key // 12:04d}-{key % 12 + 1:02d}'}
+    if dimension == 'status':
+        return {'status': STATUSES[key]}
+    return {dimension: key}
+
+
+def parse_group_by(value, default):
+    dimensions = [name.strip() for name in (value or default).split(',') if name.strip()]
+    unknown = [name for name in dimensions if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by {', '.join(unknown)}; expected any of {', '.join(DIMENSIONS)}")
+    if not dimensions or len(dimensions) > MAX_DIMENSIONS or len(set(dimensions)) != len(dimensions):
+        raise ValueError(f'group_by takes 1 to {MAX_DIMENSIONS} distinct dimensions')
+    return dimensions
+
+
+def _rounded(values, digits=2):
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def _median_by_group(groups, values, count):
+    """Median of ``values`` per group index, NaN where a group has none"""
+    present = ~np.isnan(values)
+    groups, values = groups[present], values[present]
+    medians = np.full(count, np.nan)
+    if not len(values):
+        return medians
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    unique, starts, sizes = np.unique(groups, return_index=True, return_counts=True)
+    medians[unique] = (values[starts + (sizes - 1) // 2] + values[starts + sizes // 2]) / 2
+    return medians
+
+
+def _visits(columns, rows, groups, count, today):
+    status = _effective_status(columns, rows, today)
+    visits = np.bincount(groups, minlength=count)
+    result = {'visits': visits.tolist()}
+    for name in ('completed', 'cancelled', 'no_show'):
+        counts = np.bincount(groups, weights=status == _STATUS_CODES[name], minlength=count)
+        result[name] = counts.astype(np.int64).tolist()
+        result[f'{name}_rate'] = _rounded(counts / np.maximum(visits, 1), 4)
+    return result
+
+
+def _arrivals(columns, rows, groups, count, today):
+    visits = np.bincount(groups, minlength=count)
+    # Distinct (group, day) pairs: how many days each group was observed on
+    pairs = np.unique(groups.astype(np.int64) * 1_000_000 + columns.day[rows])
+    days = np.bincount(pairs // 1_000_000, minlength=count)
+    return {'visits': visits.tolist(), 'days': days.tolist(),
+            'average_per_day': _rounded(visits / np.maximum(days, 1))}
+
+
+def _ratings(columns, rows, groups, count, today):
+    rating = columns.rating[rows]
+    rated = rating > 0
+    rated_count = np.bincount(groups[rated], minlength=count)
+    total = np.bincount(groups[rated], weights=rating[rated], minlength=count)
+    distribution = np.zeros((count, 5), dtype=np.int64)
+    np.add.at(distribution, (groups[rated], rating[rated] - 1), 1)
+    return {
+        'rated': rated_count.tolist(),
+        'average_rating': _rounded(np.where(rated_count > 0, total / np.maximum(rated_count, 1), np.nan)),
+        'distribution': distribution.tolist(),
+    }
+
+
+def _throughput(columns, rows, groups, count, today):
+    status = columns.status[rows]
+    completed = status == _STATUS_CODES['completed']
+    minutes = columns.service[rows].astype(np.float64) / 60
+    minutes[~completed] = np.nan
+    timed = ~np.isnan(minutes)
+    completed_count = np.bincount(groups[completed], minlength=count)
+    timed_count = np.bincount(groups[timed], minlength=count)
+    total = np.bincount(groups[timed], weights=minutes[timed], minlength=count)
+    return {
+        'completed': completed_count.tolist(),
+        'average_service_minutes': _rounded(np.where(timed_count > 0, total / np.maximum(timed_count, 1), np.nan), 1),
+        'median_service_minutes': _rounded(_median_by_group(groups, minutes, count), 1),
+    }
+
+
+REPORTS = {
+    'visits': (_visits, 'day'),
+    'arrivals': (_arrivals, 'hour'),
+    'ratings': (_ratings, 'department'),
+    'throughput': (_throughput, 'doctor,week'),
+}
+
+
+def report(columns, name, group_by=None, date_from=None, date_to=None, doctor_id=None, department_id=None,
+           today=None):
+    """Aggregate the snapshot for one of REPORTS.
+
+    Selects the visits in [date_from, date_to] (default: the last
+    DEFAULT_RANGE_DAYS days), optionally of one doctor or department,
+    groups them by the comma separated ``group_by`` dimensions and returns
+    one dict per group, ordered by the group keys. Raises ValueError for
+    bad arguments.
+    """
+    measure, default_group_by = REPORTS[name]
+    dimensions = parse_group_by(group_by, default_group_by)
+    today = today or date.today()
+    date_to = date_to or today
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if date_from > date_to:
+        raise ValueError('date_from must not be after date_to')
+
+    selected = (columns.day >= day_number(date_from)) & (columns.day <= day_number(date_to))
+    if doctor_id is not None:
+        selected &= columns.doctor == doctor_id
+    if department_id is not None:
+        selected &= columns.department_of[columns.doctor] == department_id
+    rows = np.flatnonzero(selected)
+
+    groups = []
+    if len(rows):
+        keys = np.stack([_dimension_keys(columns, dimension, rows, today) for dimension in dimensions])
+        unique, inverse = np.unique(keys, axis=1, return_inverse=True)
+        inverse = inverse.ravel()
+        values = measure(columns, rows, inverse, unique.shape[1], today)
+        for index in range(unique.shape[1]):
+            group = {}
+            for dimension, key in zip(dimensions, unique[:, index]):
+                group.update(_label(columns, dimension, key))
+            group.update({measure_name: column[index] for measure_name, column in values.items()})
+            groups.append(group)
+
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'group_by': dimensions,
+        'groups': groups,
+    }
+
+
+snapshot = VisitSnapshot()
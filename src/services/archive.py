@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy import delete, select
+from src.models.user import db
+from src.models.visit import Visit
+from src.models.visit_archive import VisitArchive
+from src.services import delta_sync
+from src.services.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_STATUSES = ('completed', 'cancelled')
+DEFAULT_AFTER_DAYS = 180
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_visits(after_days=DEFAULT_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """Move completed and cancelled visits older than ``after_days`` to visit_archive.
+
+    Each batch is copied and deleted in its own short transaction, so the
+    write lock is only held for one batch at a time and the queue keeps
+    working while a large backlog drains. Safe to run from several
+    processes at once: rows already copied by another run are skipped.
+    Returns the number of visits moved.
+    """
+    cutoff = date.today() - timedelta(days=after_days)
+    columns = [column.name for column in Visit.__table__.columns]
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = [row[0] for row in db.session.execute(
+            select(Visit.id)
+            .where(Visit.visit_date < cutoff, Visit.status.in_(ARCHIVED_STATUSES))
+            .order_by(Visit.visit_date, Visit.id)  # walks ix_visit_date
+            .limit(batch_size)
+        )]
+        if not ids:
+            break
+
+        # Archived visits are history, not changes: they are not reported to
+        # visit_events, so the daily stats keep counting them. Delta sync
+        # clients still get tombstones, as the full lists drop them.
+        copy = select(*[Visit.__table__.c[name] for name in columns]).where(Visit.id.in_(ids))
+        db.session.execute(
+            upsert(db.session, VisitArchive.__table__).from_select(columns, copy).on_conflict_do_nothing()
+        )
+        delta_sync.record_removed(db.session, Visit.id.in_(ids))
+        db.session.execute(delete(Visit.__table__).where(Visit.id.in_(ids)))
+        db.session.commit()
+
+        moved += len(ids)
+        batches += 1
+    return moved
+
+
+class ArchiveScheduler:
+    """Runs archive_visits, and pruning of the delta sync change log, periodically on a daemon thread"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, app, archive_interval, prune_interval, after_days=DEFAULT_AFTER_DAYS,
+              batch_size=DEFAULT_BATCH_SIZE, sync_retention_days=delta_sync.DEFAULT_RETENTION_DAYS):
+        """Archive every ``archive_interval`` and prune every ``prune_interval`` seconds; 0 disables either"""
+        if self._thread is not None:
+            return
+        jobs = []
+        if archive_interval:
+            jobs.append((archive_interval, lambda: archive_visits(after_days, batch_size), 'Archived %d visits'))
+        if prune_interval:
+            jobs.append((prune_interval, lambda: delta_sync.prune(sync_retention_days), 'Pruned %d change log rows'))
+        if not jobs:
+            return
+        self._stop.clear()
+
+        def run():
+            due = [time.monotonic() + interval for interval, _, _ in jobs]
+            while not self._stop.wait(min(interval for interval, _, _ in jobs)):
+                for index, (interval, job, message) in enumerate(jobs):
+                    if time.monotonic() < due[index]:
+                        continue
+                    due[index] += interval
+                    try:
+                        with app.app_context():
+                            count = job()
+                        if count:
+                            logger.info(message, count)
+                    except Exception:
+                        logger.exception('Scheduled visit maintenance failed')
+
+        self._thread = threading.Thread(target=run, name='visit-archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+archive_scheduler = ArchiveScheduler()
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.user import db, User
+
+CACHE_TTL_SECONDS = 60
+CACHE_SIZE = 4096
+
+
+class CachedUser:
+    """Read-only snapshot of a User row used for authorization"""
+    __slots__ = ('id', 'username', 'role', 'doctor_id', '_data')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.role = user.role
+        self.doctor_id = user.doctor_id
+        self._data = user.to_dict()
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class UserCache:
+    """LRU cache of user snapshots with a TTL.
+
+    Entries are dropped when a commit touches the user (role, doctor
+    assignment, deletion). The TTL bounds staleness for changes committed
+    by other worker processes. Like ReferenceCache, the cache has a
+    generation bumped by every invalidation; a row read under an older
+    generation is returned but not stored, so a load racing a commit never
+    puts the old snapshot back.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+    def get(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generation
+
+        user = db.session.get(User, user_id)
+        snapshot = CachedUser(user) if user else None
+        if snapshot:
+            with self._lock:
+                if generation != self._generation:
+                    return snapshot
+                self._entries[user_id] = (now + self.ttl, snapshot)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def current_user():
+    """The authenticated user of the request, from the cache"""
+    return user_cache.get(get_jwt_identity())
+
+
+def role_required(role):
+    """Require a valid JWT belonging to a user with the given role.
+
+    The role claim embedded at login rejects tokens of other roles without
+    any lookup; otherwise the user comes from the cache and is exposed to
+    the view as g.current_user.
+    """
+    def decorator(view):
+        @wraps(view)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if get_jwt().get('role', role) != role:
+                return _access_denied(role)
+            user = current_user()
+            if not user or user.role != role:
+                return _access_denied(role)
+            g.current_user = user
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _access_denied(role):
+    return jsonify({'error': f'Access denied. {role.capitalize()} role required.'}), 403
+
+
+_PENDING_KEY = 'invalidated_users'
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop(_PENDING_KEY, None)
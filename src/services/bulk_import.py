@@ -0,0 +1,237 @@
+import csv
+import io
+import json
+from datetime import date
+from itertools import islice
+from src.models.user import db
+from src.models.doctor import Doctor
+from src.models.patient import Patient
+from src.models.visit import Visit
+from src.services.queue_numbers import allocate_queue_number
+from src.services.upsert import upsert
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+PATIENT_FIELDS = ('social_id', 'name', 'age', 'phone')
+
+
+class BulkReport:
+    """Outcome of a bulk request, with errors reported per input row"""
+
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.error_count = 0
+        self.items = []
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'error': message})
+
+    def to_dict(self):
+        result = {
+            'created': self.created,
+            'skipped': self.skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+        if self.items:
+            result['items'] = self.items
+        return result
+
+
+def iter_records(request):
+    """Yield (row number, dict) from a CSV, NDJSON or JSON array request body.
+
+    CSV and NDJSON bodies are read line by line from the request stream, so
+    the upload is never held in memory as a whole. Row numbers start at 1
+    (the CSV header is not counted).
+    """
+    content_type = (request.mimetype or '').lower()
+
+    if content_type == 'text/csv':
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+    elif content_type in ('application/x-ndjson', 'application/jsonlines'):
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+        number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+    else:
+        data = request.get_json()
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array, CSV (text/csv) or NDJSON (application/x-ndjson) body')
+        yield from enumerate(data, start=1)
+
+
+def chunks(records, size=CHUNK_SIZE):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _patient_values(record):
+    if not isinstance(record, dict):
+        raise ValueError('Row is not an object')
+    values = {field: record.get(field) for field in PATIENT_FIELDS}
+    missing = [field for field, value in values.items() if value in (None, '')]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    try:
+        values['age'] = int(values['age'])
+    except (TypeError, ValueError):
+        raise ValueError('age must be an integer')
+    values['social_id'] = str(values['social_id']).strip()
+    values['phone'] = str(values['phone']).strip()
+    return values
+
+
+def import_patients(records):
+    """Insert new patients in chunked transactions, skipping known social IDs"""
+    report = BulkReport()
+
+    for chunk in chunks(records):
+        rows = []
+        seen = set()
+        for number, record in chunk:
+            try:
+                values = _patient_values(record)
+            except ValueError as e:
+                report.error(number, str(e))
+                continue
+            if values['social_id'] in seen:
+                report.error(number, 'Duplicate social ID in upload')
+                continue
+            seen.add(values['social_id'])
+            rows.append((number, values))
+
+        # One set-based lookup for the whole chunk instead of one per patient
+        existing = {social_id for (social_id,) in db.session.query(Patient.social_id).filter(
+            Patient.social_id.in_([values['social_id'] for _, values in rows])
+        )} if rows else set()
+        new_rows = []
+        for number, values in rows:
+            if values['social_id'] in existing:
+                report.error(number, 'Patient with this social ID already exists')
+                report.skipped += 1
+            else:
+                new_rows.append((number, values))
+
+        if not new_rows:
+            continue
+        try:
+            # A patient created concurrently after the lookup is skipped, not a failed chunk
+            statement = upsert(db.session, Patient.__table__).on_conflict_do_nothing(index_elements=['social_id'])
+            result = db.session.execute(statement, [values for _, values in new_rows])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for number, _ in new_rows:
+                report.error(number, f'Chunk failed: {e}')
+            continue
+        inserted = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(new_rows)
+        report.created += inserted
+        report.skipped += len(new_rows) - inserted
+
+    return report
+
+
+def _visit_values(record, include_admin_notes=True):
+    if not isinstance(record, dict):
+        raise ValueError('Row is not an object')
+    try:
+        patient_id = int(record.get('patient_id'))
+        doctor_id = int(record.get('doctor_id'))
+    except (TypeError, ValueError):
+        raise ValueError('patient_id and doctor_id must be integers')
+    values = {
+        'patient_id': patient_id,
+        'doctor_id': doctor_id,
+        'description': record.get('description', ''),
+    }
+    if include_admin_notes:
+        values['admin_notes'] = record.get('admin_notes', '')
+    return values
+
+
+def check_in_visits(records, doctor_id=None):
+    """Create today's visits in chunked transactions.
+
+    Queue numbers are reserved as one block per doctor per chunk. With
+    ``doctor_id`` every row is checked in with that doctor (the secretary's
+    case): a doctor_id in the row is ignored, and so are admin_notes, which
+    only central control may write.
+    """
+    report = BulkReport()
+    today = date.today()
+
+    for chunk in chunks(records):
+        rows = []
+        for number, record in chunk:
+            if doctor_id is not None and isinstance(record, dict):
+                record = {**record, 'doctor_id': doctor_id}
+            try:
+                rows.append((number, _visit_values(record, include_admin_notes=doctor_id is None)))
+            except ValueError as e:
+                report.error(number, str(e))
+
+        patient_ids = {values['patient_id'] for _, values in rows}
+        doctor_ids = {values['doctor_id'] for _, values in rows}
+        known_patients = {found for (found,) in db.session.query(Patient.id).filter(Patient.id.in_(patient_ids))}
+        open_doctors = {found for (found,) in db.session.query(Doctor.id).filter(
+            Doctor.id.in_(doctor_ids), Doctor.can_assign_patients.is_(True)
+        )}
+
+        by_doctor = {}
+        for number, values in rows:
+            if values['patient_id'] not in known_patients:
+                report.error(number, 'Patient not found')
+            elif values['doctor_id'] not in open_doctors:
+                report.error(number, 'Doctor not found or not allowed to assign patients')
+            else:
+                by_doctor.setdefault(values['doctor_id'], []).append((number, values))
+
+        if not by_doctor:
+            continue
+        created = []
+        try:
+            for visit_doctor_id, doctor_rows in by_doctor.items():
+                first_number = allocate_queue_number(visit_doctor_id, today, count=len(doctor_rows))
+                for offset, (number, values) in enumerate(doctor_rows):
+                    visit = Visit(queue_number=first_number + offset, visit_date=today, **values)
+                    created.append((number, visit))
+            # One flush batches the INSERTs and still runs the visit change hooks
+            db.session.add_all(visit for _, visit in created)
+            db.session.flush()
+            items = [{
+                'row': number,
+                'id': visit.id,
+                'patient_id': visit.patient_id,
+                'doctor_id': visit.doctor_id,
+                'queue_number': visit.queue_number
+            } for number, visit in created]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for doctor_rows in by_doctor.values():
+                for number, _ in doctor_rows:
+                    report.error(number, f'Chunk failed: {e}')
+            continue
+
+        report.created += len(items)
+        report.items.extend(items)
+
+    return report
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from flask import jsonify
+from sqlalchemy import delete, func, insert, literal, select
+from src.models.user import db
+from src.models.visit import Visit
+from src.models.visit_change_log import VisitChangeLog
+from src.services import visit_events
+from src.services.pagination import decode_cursor, encode_cursor
+
+# Log rows read per response; clients with more to catch up get has_more
+MAX_CHANGES = 1000
+DEFAULT_RETENTION_DAYS = 7
+
+TOKEN_HEADER = 'X-Sync-Token'
+
+
+class TokenExpired(Exception):
+    """The changes after the token have been pruned; the client must reload"""
+
+
+def record_changes(session, changes):
+    """Append the changes to the change log, in the transaction that makes them"""
+    now = datetime.utcnow()
+    session.connection().execute(insert(VisitChangeLog.__table__), [{
+        'visit_id': change.visit_id,
+        'doctor_id': change.doctor_id,
+        'visit_date': change.visit_date,
+        'deleted': change.deleted,
+        'changed_at': now,
+    } for change in changes])
+
+
+def record_removed(session, *criteria):
+    """Log tombstones for the visits matching ``criteria``, before they leave the visit table.
+
+    For Core deletes that bypass visit_events, such as archiving; run it in
+    the same transaction as the delete.
+    """
+    session.execute(insert(VisitChangeLog.__table__).from_select(
+        ['visit_id', 'doctor_id', 'visit_date', 'deleted', 'changed_at'],
+        select(Visit.id, Visit.doctor_id, Visit.visit_date, literal(True), literal(datetime.utcnow()))
+        .where(*criteria).order_by(Visit.id)
+    ))
+
+
+def current_token():
+    """Token for "everything up to now"; take it before reading the full list"""
+    head = db.session.execute(select(func.max(VisitChangeLog.seq))).scalar()
+    return encode_cursor([head or 0])
+
+
+def parse_token(token):
+    try:
+        return decode_cursor(token, [VisitChangeLog.seq])[0]
+    except ValueError:
+        raise ValueError('Invalid sync token')
+
+
+def changes_since(seq, *criteria, limit=None):
+    """Visits changed after ``seq`` among the log rows matching ``criteria``.
+
+    Returns ({visit_id: deleted}, next seq, has_more), reading at most
+    ``limit`` (default MAX_CHANGES) log rows through the seq primary key (or an index starting
+    with the criteria columns), so the cost follows the number of changes,
+    not the size of the visit table. Raises TokenExpired when rows after
+    ``seq`` have been pruned.
+
+    Seqs are handed out in commit order because SQLite has a single writer.
+    """
+    limit = limit or MAX_CHANGES
+    head, oldest = db.session.execute(select(func.max(VisitChangeLog.seq), func.min(VisitChangeLog.seq))).one()
+    if oldest is not None and seq < oldest - 1:
+        raise TokenExpired()
+
+    rows = db.session.execute(
+        select(VisitChangeLog.seq, VisitChangeLog.visit_id, VisitChangeLog.deleted)
+        .where(VisitChangeLog.seq > seq, VisitChangeLog.seq <= (head or 0), *criteria)
+        .order_by(VisitChangeLog.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for row in rows:
+        latest[row.visit_id] = row.deleted
+    return latest, rows[-1].seq if has_more else (head or 0), has_more
+
+
+def sync_response(token, query, *criteria, include_admin_notes=False, fields=None):
+    """Answer a ?since=<token> request.
+
+    ``query`` is the serialized visit query of the full list with its
+    filters, ``criteria`` the same restrictions on VisitChangeLog columns.
+    Returns {'items': changed rows still in the list, 'deleted': ids to
+    drop (deleted, archived or no longer matching the filters),
+    'has_more', 'token'}; the token is also sent as the X-Sync-Token
+    header. ``fields`` is the sparse fieldset ``query`` was built with.
+    Raises ValueError for a malformed token and TokenExpired.
+    """
+    latest, next_seq, has_more = changes_since(parse_token(token), *criteria)
+    items = []
+    if latest:
+        rows = query.filter(Visit.id.in_(list(latest))).order_by(Visit.visit_date, Visit.id)
+        items = Visit.serialize(rows, include_admin_notes, fields)
+    returned = {item['id'] for item in items}
+    next_token = encode_cursor([next_seq])
+
+    response = jsonify({
+        'items': items,
+        'deleted': [visit_id for visit_id in latest if visit_id not in returned],
+        'has_more': has_more,
+        'token': next_token,
+    })
+    response.headers[TOKEN_HEADER] = next_token
+    return response
+
+
+def prune(retention_days=DEFAULT_RETENTION_DAYS):
+    """Delete log rows older than ``retention_days``, always keeping the newest.
+
+    Tokens from before the pruned rows then get TokenExpired. Returns the
+    number of rows deleted.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    # seq and changed_at grow together: find the last old row from the end
+    last_old = db.session.execute(
+        select(VisitChangeLog.seq).where(VisitChangeLog.changed_at < cutoff)
+        .order_by(VisitChangeLog.seq.desc()).limit(1)
+    ).scalar()
+    if last_old is None:
+        return 0
+    head = db.session.execute(select(func.max(VisitChangeLog.seq))).scalar()
+    result = db.session.execute(delete(VisitChangeLog).where(VisitChangeLog.seq <= min(last_old, head - 1)))
+    db.session.commit()
+    return result.rowcount
+
+
+visit_events.on_flush(record_changes)
@@ -0,0 +1,105 @@
+from collections import defaultdict
+from src.models.user import db
+from src.models.visit import Visit
+from src.models.visit_archive import VisitArchive
+from src.models.doctor_stats import DoctorDailyStats
+from src.services import visit_events
+from src.services.upsert import upsert
+
+STATUS_COLUMNS = {
+    'waiting': 'waiting_count',
+    'in_progress': 'in_progress_count',
+    'completed': 'completed_count',
+    'cancelled': 'cancelled_count',
+}
+COUNTERS = (
+    'total_visits', 'waiting_count', 'in_progress_count', 'completed_count', 'cancelled_count',
+    'rating_sum', 'rating_count', 'service_seconds'
+)
+
+
+def _contribution(status, rating, created_at, completed_at):
+    """What one visit in the given state adds to its doctor's daily totals"""
+    values = {'total_visits': 1}
+    if status in STATUS_COLUMNS:
+        values[STATUS_COLUMNS[status]] = 1
+    if rating is not None:
+        values['rating_sum'] = rating
+        values['rating_count'] = 1
+    if completed_at and created_at:
+        values['service_seconds'] = (completed_at - created_at).total_seconds()
+    return values
+
+
+def _delta(change):
+    delta = defaultdict(int)
+    if not change.created:
+        before = _contribution(change.previous_status, change.previous_rating, change.created_at, change.previous_completed_at)
+        for name, value in before.items():
+            delta[name] -= value
+    if not change.deleted:
+        after = _contribution(change.status, change.rating, change.created_at, change.completed_at)
+        for name, value in after.items():
+            delta[name] += value
+    return delta
+
+
+def apply_changes(session, changes):
+    """Fold visit changes into doctor_daily_stats within the current transaction"""
+    totals = {}
+    for change in changes:
+        delta = totals.setdefault((change.doctor_id, change.visit_date), defaultdict(int))
+        for name, value in _delta(change).items():
+            delta[name] += value
+
+    for (doctor_id, visit_date), delta in totals.items():
+        delta = {name: value for name, value in delta.items() if value}
+        if not delta:
+            continue
+
+        values = {name: delta.get(name, 0) for name in COUNTERS}
+        set_ = {name: getattr(DoctorDailyStats, name) + value for name, value in delta.items()}
+
+        statement = upsert(session, DoctorDailyStats).values(
+            doctor_id=doctor_id, visit_date=visit_date, **values
+        ).on_conflict_do_update(
+            index_elements=[DoctorDailyStats.doctor_id, DoctorDailyStats.visit_date],
+            set_=set_
+        )
+        session.connection().execute(statement)
+
+
+def rebuild(visit_date=None):
+    """Recompute the stats rows from the visit and visit_archive tables (all days, or one)"""
+    query = db.session.query(
+        Visit.doctor_id, Visit.visit_date, Visit.status, Visit.rating, Visit.created_at, Visit.completed_at
+    )
+    archived = db.session.query(
+        VisitArchive.doctor_id, VisitArchive.visit_date, VisitArchive.status, VisitArchive.rating,
+        VisitArchive.created_at, VisitArchive.completed_at
+    )
+    stats_query = DoctorDailyStats.query
+    if visit_date:
+        query = query.filter(Visit.visit_date == visit_date)
+        archived = archived.filter(VisitArchive.visit_date == visit_date)
+        stats_query = stats_query.filter(DoctorDailyStats.visit_date == visit_date)
+    query = query.union_all(archived)
+
+    rows = {}
+    for visit in query.yield_per(1000):
+        key = (visit.doctor_id, visit.visit_date)
+        stats = rows.get(key)
+        if stats is None:
+            stats = rows[key] = DoctorDailyStats(doctor_id=visit.doctor_id, visit_date=visit.visit_date)
+            for name in COUNTERS:
+                setattr(stats, name, 0)
+        for name, value in _contribution(visit.status, visit.rating, visit.created_at, visit.completed_at).items():
+            setattr(stats, name, getattr(stats, name) + value)
+
+    stats_query.delete(synchronize_session=False)
+    db.session.add_all(rows.values())
+    db.session.commit()
+    return len(rows)
+
+
+visit_events.on_flush(apply_changes)
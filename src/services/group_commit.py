@@ -0,0 +1,173 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from flask import current_app
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+
+class WriterOverloaded(Exception):
+    """Raised when the write queue is full or a write waited past its deadline"""
+
+
+class _Job:
+    __slots__ = ('work', 'future', 'deadline')
+
+    def __init__(self, work, deadline):
+        self.work = work
+        self.future = Future()
+        self.deadline = deadline
+
+
+class GroupCommitWriter:
+    """Coalesces small writes from concurrent requests into shared transactions.
+
+    Every commit on SQLite is an fsync and holds the write lock, so one
+    commit per click caps peak write throughput. With the writer enabled,
+    requests hand their write to a single thread as a function of no
+    arguments; it runs whatever arrived within ``max_delay`` seconds (at
+    most ``max_batch`` writes) in one transaction, commits once and only
+    then hands each request its result. Each write is flushed on its own,
+    so a failing one is rolled back and reported to its request alone and
+    the rest of the batch is replayed.
+
+    At most ``max_pending`` writes may wait; beyond that, or when a write
+    is still queued after ``timeout`` seconds, WriterOverloaded is raised
+    and the write is not applied. Disabled, run() just calls the function
+    and commits in the request.
+    """
+
+    def __init__(self, enabled=False, max_delay=0.002, max_batch=64, max_pending=256, timeout=5):
+        self.configure(enabled, max_delay, max_batch, max_pending, timeout)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, enabled, max_delay, max_batch, max_pending, timeout):
+        self.enabled = enabled
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue(max_pending)
+
+    def init_app(self, app):
+        self.configure(
+            app.config['GROUP_COMMIT'],
+            app.config['GROUP_COMMIT_MAX_DELAY_MS'] / 1000,
+            app.config['GROUP_COMMIT_MAX_BATCH'],
+            app.config['GROUP_COMMIT_MAX_PENDING'],
+            app.config['GROUP_COMMIT_TIMEOUT']
+        )
+
+    def run(self, work):
+        """Run ``work()`` in a transaction and return its result once committed.
+
+        ``work`` uses db.session and must not commit or read the request;
+        with the writer enabled it runs on another thread, possibly next to
+        other requests' writes.
+        """
+        if not self.enabled:
+            try:
+                result = work()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return result
+
+        self._ensure_started(current_app._get_current_object())
+        job = _Job(work, time.monotonic() + self.timeout)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise WriterOverloaded()
+        try:
+            # Queued jobs are dropped at their deadline; a job that started
+            # in time is always answered, so this only guards a dead writer.
+            return job.future.result(timeout=self.timeout + 30)
+        except TimeoutError:
+            raise WriterOverloaded()
+
+    def _ensure_started(self, app):
+        # Started lazily so that every forked worker gets its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, args=(app,), name='group-commit', daemon=True)
+                self._thread.start()
+
+    def _loop(self, app):
+        with app.app_context():
+            while True:
+                batch = self._next_batch()
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.exception('Group commit failed')
+                    db.session.rollback()
+                    for job in batch:
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                finally:
+                    db.session.remove()
+
+    def _next_batch(self):
+        """Block for the first write, then gather more for up to max_delay"""
+        batch = [self._queue.get()]
+        closes = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = closes - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        now = time.monotonic()
+        live = []
+        for job in batch:
+            if job.deadline < now:
+                job.future.set_exception(WriterOverloaded())
+            else:
+                live.append(job)
+        return live
+
+    def _write(self, batch):
+        pending = batch
+        while pending:
+            results = []
+            failed = None
+            for job in pending:
+                try:
+                    results.append(job.work())
+                    db.session.flush()
+                except Exception as e:
+                    failed = job
+                    job.future.set_exception(e)
+                    break
+            if failed is not None:
+                # Undo the whole transaction and replay everyone else
+                db.session.rollback()
+                pending = [job for job in pending if job is not failed]
+                continue
+
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                if len(pending) == 1:
+                    pending[0].future.set_exception(e)
+                    return
+                # The commit itself failed: retry each write on its own
+                for job in pending:
+                    self._write([job])
+                return
+
+            for job, result in zip(pending, results):
+                job.future.set_result(result)
+            return
+
+
+group_commit = GroupCommitWriter()
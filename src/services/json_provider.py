@@ -0,0 +1,60 @@
+import os
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson.
+
+    Output matches the default provider (sorted keys, compact unless
+    debugging, dates and Decimals through the same ``default``) except that
+    non-ASCII characters are written as UTF-8 instead of \\u escapes.
+    Anything orjson refuses, such as integers beyond 64 bits, is handed to
+    the stdlib encoder.
+    """
+
+    def dumps_bytes(self, obj, indent=None):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            if indent:
+                return super().dumps(obj, indent=indent).encode('utf-8')
+            return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) - {'indent', 'separators'} or kwargs.get('indent') not in (None, 2):
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, kwargs.get('indent')).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def configure_json(app):
+    """Pick the app's JSON encoder from the environment.
+
+    JSON_ENCODER    'auto' uses orjson when it is installed, 'stdlib' always
+                    uses Flask's default provider (default: auto)
+    """
+    choice = os.environ.get('JSON_ENCODER', 'auto')
+    if choice not in ('auto', 'stdlib'):
+        raise ValueError(f"Unknown JSON_ENCODER {choice!r}; expected 'auto' or 'stdlib'")
+    app.config['JSON_ENCODER'] = 'orjson' if choice == 'auto' and orjson is not None else 'stdlib'
+    if app.config['JSON_ENCODER'] == 'orjson':
+        app.json = FastJSONProvider(app)
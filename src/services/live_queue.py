@@ -0,0 +1,177 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date
+from src.models.user import db
+from src.models.visit import Visit
+from src.services import visit_events
+
+ACTIVE_STATUSES = ('waiting', 'in_progress')
+
+# Each worker process keeps its own copy of the queue. Changes committed by
+# this process are applied immediately; a day's state is reloaded from the
+# database once it is older than this, which bounds how stale another
+# worker's changes can be.
+MAX_AGE_SECONDS = 5.0
+
+
+class DayQueue:
+    """Queue state of every doctor for one day"""
+
+    def __init__(self, day):
+        self.day = day
+        self.loaded_at = time.monotonic()
+        self.visits = {}    # active visit_id -> (patient_id, doctor_id, queue_number, status)
+        self.waiting = {}   # doctor_id -> sorted waiting queue numbers
+        self.active = {}    # patient_id -> sorted ids of waiting/in progress visits
+
+    def apply(self, visit_id, patient_id, doctor_id, queue_number, status):
+        self.remove(visit_id)
+        if status not in ACTIVE_STATUSES:
+            return
+        self.visits[visit_id] = (patient_id, doctor_id, queue_number, status)
+        if status == 'waiting':
+            insort(self.waiting.setdefault(doctor_id, []), queue_number)
+        insort(self.active.setdefault(patient_id, []), visit_id)
+
+    def remove(self, visit_id):
+        previous = self.visits.pop(visit_id, None)
+        if previous is None:
+            return
+        patient_id, doctor_id, queue_number, status = previous
+        if status == 'waiting':
+            _discard(self.waiting.get(doctor_id), queue_number)
+        _discard(self.active.get(patient_id), visit_id)
+
+    def ahead_of(self, visit_id):
+        """Number of waiting visits with a lower queue number at the same doctor"""
+        entry = self.visits.get(visit_id)
+        if entry is None:
+            return None
+        _, doctor_id, queue_number, _ = entry
+        return bisect_left(self.waiting.get(doctor_id, []), queue_number)
+
+
+def _discard(sorted_values, value):
+    if not sorted_values:
+        return
+    index = bisect_left(sorted_values, value)
+    if index < len(sorted_values) and sorted_values[index] == value:
+        del sorted_values[index]
+
+
+class LiveQueue:
+    """In-process view of today's queues answering position lookups without SQL"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = {}
+        self._loading = {}  # day -> changes applied while a reload was running
+
+    def rebuild(self, day):
+        """Reload a day's queue state from the database"""
+        with self._lock:
+            self._loading[day] = []
+
+        fresh = DayQueue(day)
+        try:
+            rows = db.session.query(
+                Visit.id, Visit.patient_id, Visit.doctor_id, Visit.queue_number, Visit.status
+            ).filter(Visit.visit_date == day, Visit.status.in_(ACTIVE_STATUSES)).all()
+            for row in rows:
+                fresh.apply(*row)
+        finally:
+            with self._lock:
+                replay = self._loading.pop(day, [])
+
+        with self._lock:
+            # Changes committed while we were reading may be missing from the
+            # rows above; apply them on top of the fresh state.
+            for change in replay:
+                fresh.apply(*change)
+            self._days = {d: q for d, q in self._days.items() if d >= day}
+            self._days[day] = fresh
+        return fresh
+
+    def _get_day(self, day):
+        queue = self._days.get(day)
+        if queue is None or time.monotonic() - queue.loaded_at > MAX_AGE_SECONDS:
+            if queue is not None and day in self._loading:
+                # Another request is already reloading; answer from current state
+                return queue
+            queue = self.rebuild(day)
+        return queue
+
+    def ensure_loaded(self, day=None):
+        """Load the day's state from the database if it is missing or stale"""
+        self._get_day(day or date.today())
+
+    def active_visit_id(self, patient_id, day=None):
+        """Id of the patient's waiting or in progress visit for the day, if any"""
+        day = day or date.today()
+        queue = self._get_day(day)
+        with self._lock:
+            visit_ids = queue.active.get(patient_id)
+            return visit_ids[0] if visit_ids else None
+
+    def ahead_of(self, visit_id, day=None):
+        """How many waiting visits are ahead of the given one"""
+        day = day or date.today()
+        queue = self._get_day(day)
+        with self._lock:
+            return queue.ahead_of(visit_id)
+
+    def doctor_positions(self, doctor_id, day):
+        """Waiting queue numbers and {visit_id: (status, ahead)} of a doctor's active visits.
+
+        Only reads what is in memory; never queries the database, so it is
+        safe to call from commit hooks.
+        """
+        with self._lock:
+            queue = self._days.get(day)
+            if queue is None:
+                return [], {}
+            positions = {
+                visit_id: (entry[3], queue.ahead_of(visit_id))
+                for visit_id, entry in queue.visits.items() if entry[1] == doctor_id
+            }
+            return list(queue.waiting.get(doctor_id, [])), positions
+
+    def apply_changes(self, changes):
+        with self._lock:
+            for change in changes:
+                status = None if change.deleted else change.status
+                values = (change.visit_id, change.patient_id, change.doctor_id, change.queue_number, status)
+                if change.visit_date in self._loading:
+                    self._loading[change.visit_date].append(values)
+                queue = self._days.get(change.visit_date)
+                if queue is not None:
+                    queue.apply(*values)
+
+    def verify(self, day=None):
+        """Compare every cached queue position of the day with the SQL answer.
+
+        Returns a list of (visit_id, cached, expected) for mismatches.
+        """
+        day = day or date.today()
+        queue = self._get_day(day)
+        with self._lock:
+            cached = {visit_id: queue.ahead_of(visit_id) for visit_id in queue.visits}
+
+        mismatches = []
+        active = Visit.query.filter(Visit.visit_date == day, Visit.status.in_(ACTIVE_STATUSES)).all()
+        for visit in active:
+            expected = Visit.query.filter_by(
+                doctor_id=visit.doctor_id,
+                visit_date=day,
+                status='waiting'
+            ).filter(Visit.queue_number < visit.queue_number).count()
+            if cached.pop(visit.id, None) != expected:
+                mismatches.append((visit.id, queue.ahead_of(visit.id), expected))
+        # Anything left is cached as active but no longer active in the database
+        mismatches.extend((visit_id, ahead, None) for visit_id, ahead in cached.items())
+        return mismatches
+
+
+live_queue = LiveQueue()
+visit_events.on_commit(live_queue.apply_changes)
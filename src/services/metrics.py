@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# Request header asking for a Server-Timing breakdown in the response
+SERVER_TIMING_HEADER = 'X-Server-Timing'
+
+
+class Histogram:
+    """Cumulative Prometheus histogram, one series per label tuple"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels.rstrip(",")}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{labels.rstrip(",")}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Prometheus counter, one series per label tuple"""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f'{self.name}{{{_format_labels(self.labels, label_values).rstrip(",")}}} {value}')
+        return lines
+
+
+def _format_labels(names, values):
+    return ''.join(f'{name}="{_escape(value)}",' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_seconds = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.',
+    ('endpoint', 'method', 'status'), LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    'http_request_sql_queries', 'SQL statements executed per request.',
+    ('endpoint',), QUERY_COUNT_BUCKETS
+)
+request_sql_seconds = Histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request.',
+    ('endpoint',), LATENCY_BUCKETS
+)
+slow_queries = Counter('sql_slow_queries_total', 'SQL statements slower than SLOW_QUERY_SECONDS.', ('endpoint',))
+
+METRICS = [request_seconds, request_queries, request_sql_seconds, slow_queries]
+
+
+class RequestStats:
+    __slots__ = ('endpoint', 'started', 'queries', 'sql_seconds', 'status', 'recorded')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.status = None
+        self.recorded = False
+
+
+# Stats of the request running in the current thread/context, if any
+_current = ContextVar('request_stats', default=None)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Time every request and every SQL statement executed by db.engine.
+
+    SLOW_QUERY_SECONDS    statements slower than this are logged (default 0.25)
+    SERVER_TIMING         add Server-Timing to every response instead of only
+                          to requests sending X-Server-Timing: 1
+
+    Streamed responses (format=ndjson lists) run their queries while the body
+    is sent, so they are recorded at teardown once the body is done, and get
+    no Server-Timing header.
+
+    Metrics are kept per process; with several workers each one reports its
+    own share.
+    """
+    app.config.setdefault('SLOW_QUERY_SECONDS', 0.25)
+    app.config.setdefault('SERVER_TIMING', False)
+    slow_seconds = app.config['SLOW_QUERY_SECONDS']
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += elapsed
+        if elapsed >= slow_seconds:
+            endpoint = stats.endpoint if stats is not None else '-'
+            slow_queries.inc((endpoint,))
+            logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, endpoint, statement)
+
+    @app.before_request
+    def _start_request():
+        g.request_stats = RequestStats(request.endpoint or 'unmatched')
+        g.request_stats_token = _current.set(g.request_stats)
+
+    @app.after_request
+    def _finish_request(response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+        stats.status = response.status_code
+        if response.is_streamed:
+            # The body has not run yet; recorded at teardown
+            return response
+        elapsed = _record(stats, response.status_code)
+        if app.config['SERVER_TIMING'] or request.headers.get(SERVER_TIMING_HEADER) == '1':
+            response.headers['Server-Timing'] = (
+                f'db;desc="{stats.queries} queries";dur={stats.sql_seconds * 1000:.1f}, '
+                f'app;dur={(elapsed - stats.sql_seconds) * 1000:.1f}, '
+                f'total;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exc):
+        stats = g.get('request_stats')
+        if stats is None:
+            return
+        if not stats.recorded:
+            # A streamed body finished (stream_with_context keeps the request
+            # open until then), or the view raised and after_request did not run
+            _record(stats, stats.status or 500)
+        _current.reset(g.request_stats_token)
+
+
+def _record(stats, status):
+    elapsed = time.perf_counter() - stats.started
+    stats.recorded = True
+    request_seconds.observe((stats.endpoint, request.method, str(status)), elapsed)
+    request_queries.observe((stats.endpoint,), stats.queries)
+    request_sql_seconds.observe((stats.endpoint,), stats.sql_seconds)
+    return elapsed
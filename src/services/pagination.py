@@ -0,0 +1,172 @@
+import base64
+import json
+from itertools import islice
+from datetime import date, datetime
+from flask import Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque token"""
+    payload = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token, columns):
+    """Decode a cursor token back into values typed for the key columns"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_decode_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def _decode_value(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def keyset_response(query, key_columns, serialize, encoder=None):
+    """Answer a list request from ``query`` ordered by ``key_columns``.
+
+    Without paging arguments the whole result is returned as a JSON list, as
+    before. ``limit`` (and ``cursor`` from a previous page) return a page as
+    ``{'items': [...], 'next_cursor': ...}``; ``format=ndjson`` streams one
+    JSON document per line straight from the database cursor. Raises
+    ValueError for malformed arguments.
+
+    When the query returns plain rows, ``encoder`` (a JSONColumns) can write
+    them to JSON directly instead of going through ``serialize``.
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    stream = request.args.get('format') == 'ndjson'
+
+    query = query.order_by(*key_columns)
+    if cursor:
+        values = decode_cursor(cursor, key_columns)
+        query = query.filter(tuple_(*key_columns) > tuple_(*values))
+
+    limit = _limit_arg(limit)
+
+    if stream:
+        if limit is not None:
+            query = query.limit(limit)
+
+        def generate():
+            if encoder is not None:
+                rows = iter(query.yield_per(STREAM_BATCH_SIZE))
+                while batch := list(islice(rows, STREAM_BATCH_SIZE)):
+                    yield ''.join(line + '\n' for line in encoder.encode_each(batch))
+                return
+            for row in query.yield_per(STREAM_BATCH_SIZE):
+                yield current_app.json.dumps(serialize(row)) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if limit is None and not cursor:
+        if encoder is not None:
+            return _json_text(encoder.encode(query.all()))
+        return jsonify([serialize(row) for row in query]), 200
+
+    limit = limit or MAX_PAGE_SIZE
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in key_columns])
+
+    if encoder is not None:
+        return _json_text('{"items":%s,"next_cursor":%s}' % (encoder.encode(rows), json.dumps(next_cursor)))
+    return jsonify({
+        'items': [serialize(row) for row in rows],
+        'next_cursor': next_cursor
+    }), 200
+
+
+def _json_text(body):
+    return current_app.response_class(body + '\n', mimetype='application/json'), 200
+
+
+def keyset_page(query, key_columns, descending=False):
+    """Apply the ``limit`` and ``cursor`` request arguments to ``query``.
+
+    Rows are ordered by ``key_columns`` (newest first with ``descending``).
+    Returns (rows, next_cursor); without paging arguments every row is
+    returned and next_cursor is None. Raises ValueError for malformed
+    arguments.
+    """
+    limit = _limit_arg(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+
+    if descending:
+        query = query.order_by(*[column.desc() for column in key_columns])
+    else:
+        query = query.order_by(*key_columns)
+    if cursor:
+        values = decode_cursor(cursor, key_columns)
+        if descending:
+            query = query.filter(tuple_(*key_columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*key_columns) > tuple_(*values))
+
+    if limit is None and not cursor:
+        return query.all(), None
+
+    limit = limit or MAX_PAGE_SIZE
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in key_columns])
+    return rows, next_cursor
+
+
+def _limit_arg(limit):
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+
+def fields_arg(available, always=('id',)):
+    """Read an optional ?fields=a,b sparse fieldset.
+
+    Returns the requested names among ``available`` (in ``available``
+    order, plus ``always``), or None when every field is wanted. Raises
+    ValueError naming unknown fields.
+    """
+    value = request.args.get('fields')
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested - set(available)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}; available: {', '.join(available)}")
+    requested.update(always)
+    return [name for name in available if name in requested]
+
+
+def date_arg(name):
+    """Read an optional YYYY-MM-DD query argument"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+
+
+class HasherOverloaded(Exception):
+    """Raised when too many password checks are already queued"""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool instead of the request thread.
+
+    bcrypt releases the GIL, so a handful of workers keep the CPU busy
+    while request threads stay free for other traffic. At most
+    ``max_pending`` checks may be running or queued; beyond that callers
+    are turned away immediately instead of piling up behind a burst.
+    """
+
+    def __init__(self, rounds=12, workers=4, max_pending=32, timeout=10):
+        self.configure(rounds, workers, max_pending, timeout)
+
+    def configure(self, rounds, workers, max_pending, timeout):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def init_app(self, app):
+        self.configure(
+            app.config['BCRYPT_ROUNDS'],
+            app.config['PASSWORD_HASH_WORKERS'],
+            app.config['PASSWORD_HASH_MAX_PENDING'],
+            app.config['PASSWORD_HASH_TIMEOUT']
+        )
+
+    def hash(self, password):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with a different cost factor than configured"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _verify(self, password, password_hash):
+        if not bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')):
+            return False, None
+        new_hash = self.hash(password) if self.needs_rehash(password_hash) else None
+        return True, new_hash
+
+    def verify(self, password, password_hash):
+        """Check a password on the pool.
+
+        Returns (valid, new_hash); new_hash is set when the stored hash uses
+        an outdated cost factor and should be replaced. Raises
+        HasherOverloaded when the pool is saturated or the check times out.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise HasherOverloaded()
+        try:
+            future = self._executor.submit(self._verify, password, password_hash)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherOverloaded()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,76 @@
+import re
+from sqlalchemy import column, select, table, text
+from sqlalchemy.orm import load_only
+from src.models.user import db
+from src.models.patient import Patient
+
+MAX_RESULTS = 200
+
+# External-content FTS5 index over patient names. The triggers keep it in
+# step with every INSERT/UPDATE/DELETE on patient, whichever code path runs
+# it. prefix='2 3' adds prefix indexes so short "ali*" queries stay cheap.
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS patient_fts USING fts5(
+        name, content='patient', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS patient_fts_insert AFTER INSERT ON patient BEGIN
+        INSERT INTO patient_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patient_fts_delete AFTER DELETE ON patient BEGIN
+        INSERT INTO patient_fts(patient_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patient_fts_update AFTER UPDATE OF name ON patient BEGIN
+        INSERT INTO patient_fts(patient_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO patient_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+PATIENT_FTS = table('patient_fts', column('rowid'), column('rank'))
+
+
+def fts_available():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def install():
+    """Create the name index and its triggers, filling it if it is new"""
+    if not fts_available():
+        return
+    with db.engine.begin() as connection:
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patient_fts'"
+        ).first()
+        for statement in FTS_DDL:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            connection.exec_driver_sql("INSERT INTO patient_fts(patient_fts) VALUES ('rebuild')")
+
+
+def match_expression(name):
+    """FTS query requiring every word of ``name`` as a word prefix, e.g. 'ali has' -> "ali"* "has"*"""
+    words = re.findall(r'\w+', name)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_by_name(name, limit=50, offset=0, fields=None):
+    """Patients whose name words start with the words of ``name``, best matches first.
+
+    ``fields`` (validated Patient.FIELDS names) limits the columns loaded.
+    """
+    limit = max(1, min(limit, MAX_RESULTS))
+    offset = max(0, offset)
+    query = select(Patient)
+    if fields is not None:
+        query = query.options(load_only(*[getattr(Patient, field) for field in fields]))
+
+    if not fts_available():
+        query = query.where(Patient.name.ilike(f'%{name}%')).order_by(Patient.id)
+    else:
+        expression = match_expression(name)
+        if not expression:
+            return []
+        query = query.join(PATIENT_FTS, PATIENT_FTS.c.rowid == Patient.id) \
+            .where(text('patient_fts MATCH :query').bindparams(query=expression)) \
+            .order_by(PATIENT_FTS.c.rank, Patient.id)
+    return db.session.scalars(query.limit(limit).offset(offset)).all()
@@ -0,0 +1,85 @@
+from datetime import date, datetime
+from sqlalchemy import func, select, update
+from src.models.user import db
+from src.models.visit import Visit
+from src.services import visit_events
+
+VISIT_STATUSES = ('waiting', 'in_progress', 'completed', 'cancelled')
+
+_visits = Visit.__table__
+_RETURNED = (
+    _visits.c.id, _visits.c.patient_id, _visits.c.doctor_id, _visits.c.visit_date, _visits.c.queue_number,
+    _visits.c.created_at, _visits.c.status, _visits.c.rating, _visits.c.completed_at
+)
+
+
+def advance_queue(doctor_id, day=None):
+    """Complete the doctor's visit in progress and call in the next waiting one.
+
+    Both updates run in one transaction; each only touches rows still in
+    the expected status, so two secretaries pressing "call next" at once
+    cannot complete or promote the same visit twice. Returns
+    (completed visit ids, promoted visit id or None); the caller commits.
+    """
+    day = day or date.today()
+    now = datetime.utcnow()
+
+    completed = _update(now, 'in_progress', 'completed', _visits.c.doctor_id == doctor_id, _visits.c.visit_date == day)
+
+    next_waiting = select(_visits.c.id).where(
+        _visits.c.doctor_id == doctor_id, _visits.c.visit_date == day, _visits.c.status == 'waiting'
+    ).order_by(_visits.c.queue_number).limit(1).scalar_subquery()
+    promoted = _update(now, 'waiting', 'in_progress', _visits.c.id == next_waiting)
+
+    return [row.id for row in completed], promoted[0].id if promoted else None
+
+
+def set_status(doctor_id, status, from_statuses, visit_ids=None, day=None):
+    """Move the doctor's visits of the day that are in ``from_statuses`` to ``status``.
+
+    One set-based UPDATE per source status (so each change knows what it
+    changed from), optionally limited to ``visit_ids``. Returns the ids of
+    the updated visits; the caller commits. Raises ValueError for unknown
+    statuses.
+    """
+    for value in (status, *from_statuses):
+        if value not in VISIT_STATUSES:
+            raise ValueError(f"Invalid status '{value}'; expected one of {', '.join(VISIT_STATUSES)}")
+
+    day = day or date.today()
+    now = datetime.utcnow()
+    updated = []
+    for from_status in dict.fromkeys(from_statuses):
+        if from_status == status:
+            continue
+        criteria = [_visits.c.doctor_id == doctor_id, _visits.c.visit_date == day]
+        if visit_ids is not None:
+            criteria.append(_visits.c.id.in_(visit_ids))
+        updated.extend(row.id for row in _update(now, from_status, status, *criteria))
+    return updated
+
+
+def _update(now, from_status, status, *criteria):
+    """UPDATE matching visits in ``from_status`` to ``status`` and report the changes to visit_events.
+
+    Core statements bypass the flush hooks, so the changes are recorded
+    here for the stats, live queue and event streams.
+    """
+    values = {'status': status, 'updated_at': now}
+    if status == 'completed':
+        # Same rule as the PUT handlers: keep an existing completion time
+        values['completed_at'] = func.coalesce(_visits.c.completed_at, now)
+
+    statement = update(_visits).where(_visits.c.status == from_status, *criteria).values(**values)
+    rows = db.session.execute(statement.returning(*_RETURNED)).all()
+
+    changes = []
+    for row in rows:
+        previous = {'status': from_status}
+        if status == 'completed':
+            # RETURNING shows the new value: it equals ``now`` only if there was none before
+            previous['completed_at'] = None if row.completed_at == now else row.completed_at
+        changes.append(visit_events.snapshot(row, previous=previous))
+    if changes:
+        visit_events.record(db.session, changes)
+    return rows
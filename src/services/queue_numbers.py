@@ -0,0 +1,34 @@
+from sqlalchemy import func, select
+from src.models.user import db
+from src.models.queue_counter import QueueCounter
+from src.models.visit import Visit
+from src.services.upsert import upsert
+
+
+def allocate_queue_number(doctor_id, visit_date, count=1):
+    """Hand out the next queue number for a doctor on a given day.
+
+    The counter row is created or incremented by a single upsert, which
+    takes the write lock, so concurrent check-ins can never read the same
+    value. The number belongs to the caller's transaction: insert the visit
+    and commit in the same session. A counter created mid-day starts after
+    the highest queue number already stored for that day.
+
+    With ``count`` > 1 a block of consecutive numbers is reserved in the
+    same statement and the first one is returned.
+    """
+    seed = select(func.coalesce(func.max(Visit.queue_number), 0) + count).where(
+        Visit.doctor_id == doctor_id,
+        Visit.visit_date == visit_date
+    ).scalar_subquery()
+
+    statement = upsert(db.session, QueueCounter).values(
+        doctor_id=doctor_id,
+        visit_date=visit_date,
+        last_number=seed
+    ).on_conflict_do_update(
+        index_elements=[QueueCounter.doctor_id, QueueCounter.visit_date],
+        set_={'last_number': QueueCounter.last_number + count}
+    ).returning(QueueCounter.last_number)
+
+    return db.session.execute(statement).scalar_one() - count + 1
@@ -0,0 +1,297 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import date
+from flask import Response, current_app
+from sqlalchemy import func, select
+from src.models.user import db
+from src.models.visit import Visit
+from src.models.visit_change_log import VisitChangeLog
+from src.services import visit_events
+from src.services.live_queue import live_queue
+from src.services.visit_events import VisitChange
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+MAX_PENDING_EVENTS = 32     # per subscriber; older events are dropped beyond this
+MAX_SUBSCRIBERS = 64        # per process; see STREAM_MAX_SUBSCRIBERS
+POLL_SECONDS = 1.0          # how often other workers' changes are picked up
+MAX_POLLED_CHANGES = 1000   # change log rows read per poll
+
+
+class HubFull(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, channel):
+        self.channel = channel
+        self.pending = deque(maxlen=MAX_PENDING_EVENTS)
+        self.ready = threading.Event()
+
+    def push(self, message):
+        self.pending.append(message)
+        self.ready.set()
+
+    def wait(self, timeout):
+        """Return the queued messages, waiting up to ``timeout`` seconds for one"""
+        if not self.ready.wait(timeout):
+            return []
+        self.ready.clear()
+        messages = []
+        while self.pending:
+            messages.append(self.pending.popleft())
+        return messages
+
+
+class EventHub:
+    """Fan-out of server-sent events to subscribers of named channels.
+
+    At most ``max_subscribers`` streams may be open in the process; beyond
+    that subscribe() raises HubFull and clients poll instead.
+    """
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._count = 0
+
+    def init_app(self, app):
+        self.max_subscribers = app.config['STREAM_MAX_SUBSCRIBERS']
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise HubFull()
+            subscription = Subscription(channel)
+            self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers and subscription in subscribers:
+                subscribers.remove(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def has_subscribers(self, channel):
+        return channel in self._channels
+
+    def subscriber_count(self):
+        return self._count
+
+    def publish(self, channel, event, data):
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(message)
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def doctor_channel(doctor_id, day):
+    return f'doctor:{doctor_id}:{day.isoformat()}'
+
+
+def visit_channel(visit_id):
+    return f'visit:{visit_id}'
+
+
+def sse_response(channel, initial_events=()):
+    """Stream a channel as text/event-stream until the client disconnects.
+
+    ``initial_events`` are (event, data) pairs sent first so the client
+    starts from the current state. Raises HubFull when the subscriber limit
+    is reached.
+    """
+    subscription = hub.subscribe(channel)
+    feed.ensure_started(current_app._get_current_object())
+
+    def generate():
+        try:
+            yield f'retry: {HEARTBEAT_SECONDS * 1000}\n\n'
+            for event, data in initial_events:
+                yield format_event(event, data)
+            while True:
+                messages = subscription.wait(HEARTBEAT_SECONDS)
+                if not messages:
+                    # Keeps proxies from closing the idle connection and lets
+                    # us notice clients that went away.
+                    yield ': heartbeat\n\n'
+                    continue
+                yield ''.join(messages)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def queue_state(doctor_id, day):
+    waiting, _ = live_queue.doctor_positions(doctor_id, day)
+    return {'doctor_id': doctor_id, 'visit_date': day.isoformat(), 'waiting': waiting}
+
+
+def visit_position(visit_id, status, ahead):
+    return {
+        'visit_id': visit_id,
+        'status': status,
+        'queue_position': ahead + 1 if ahead is not None else None
+    }
+
+
+class ChangeFeed:
+    """Publishes the visit changes committed by every worker process.
+
+    Each process has its own hub, and visit_events only reports the commits
+    of the process it runs in. Those are published straight from the commit
+    hook. While the hub has subscribers, a thread also tails
+    visit_change_log every POLL_SECONDS. It publishes the changes this
+    process has not published yet, i.e. those committed by other workers,
+    after reloading today's live queue so that positions include them.
+
+    Events carry the visit's current state, so the rare change published
+    twice (polled between its commit and its commit hook) is harmless.
+    Publishing is serialized so that a polled state never overtakes a newer
+    one from the commit hook.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._seq = None
+        self._published = {}    # day -> {visit_id: (status, queue_number), None once deleted}
+
+    def ensure_started(self, app):
+        # Started lazily so that every forked worker gets its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, args=(app,), name='change-feed', daemon=True)
+                self._thread.start()
+
+    def _loop(self, app):
+        with app.app_context():
+            while True:
+                time.sleep(POLL_SECONDS)
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception('Change feed poll failed')
+                finally:
+                    db.session.remove()
+
+    def poll(self):
+        """Publish the logged changes since the last poll that were not published here"""
+        if self._seq is None or not hub.subscriber_count():
+            # Nobody to tell: skip to the head of the log
+            self._seq = db.session.execute(select(func.max(VisitChangeLog.seq))).scalar() or 0
+            return
+
+        rows = db.session.execute(
+            select(VisitChangeLog.seq, VisitChangeLog.visit_id, VisitChangeLog.doctor_id, VisitChangeLog.visit_date)
+            .where(VisitChangeLog.seq > self._seq)
+            .order_by(VisitChangeLog.seq)
+            .limit(MAX_POLLED_CHANGES)
+        ).all()
+        if not rows:
+            return
+        self._seq = rows[-1].seq
+        logged = {row.visit_id: row for row in rows}
+
+        with self._lock:
+            visits = {visit.id: visit for visit in db.session.query(
+                Visit.id, Visit.patient_id, Visit.queue_number, Visit.status, Visit.created_at,
+                Visit.rating, Visit.completed_at
+            ).filter(Visit.id.in_(list(logged)))}
+
+            changes = []
+            for visit_id, row in logged.items():
+                visit = visits.get(visit_id)
+                state = None if visit is None else (visit.status, visit.queue_number)
+                published = self._published.get(row.visit_date, {})
+                if visit_id in published and published[visit_id] == state:
+                    continue
+                previous_status = published[visit_id][0] if published.get(visit_id) else None
+                if visit is None:
+                    # Deleted or archived since
+                    changes.append(VisitChange(
+                        visit_id, None, row.doctor_id, row.visit_date, None, None,
+                        None, None, None, previous_status, None, None, False, True
+                    ))
+                else:
+                    changes.append(VisitChange(
+                        visit_id, visit.patient_id, row.doctor_id, row.visit_date, visit.queue_number,
+                        visit.created_at, visit.status, visit.rating, visit.completed_at,
+                        previous_status, None, None, False, False
+                    ))
+            if not changes:
+                return
+
+            today = date.today()
+            if any(change.visit_date == today for change in changes):
+                live_queue.rebuild(today)
+            self._publish(changes)
+
+    def publish(self, changes):
+        """Push queue deltas for committed visit changes to subscribed clients"""
+        with self._lock:
+            self._publish(changes)
+
+    def _publish(self, changes):
+        today = date.today()
+        self._published = {day: states for day, states in self._published.items() if day >= today}
+        by_doctor = {}
+        for change in changes:
+            by_doctor.setdefault((change.doctor_id, change.visit_date), []).append(change)
+            if change.visit_date >= today:
+                self._published.setdefault(change.visit_date, {})[change.visit_id] = \
+                    None if change.deleted else (change.status, change.queue_number)
+
+        for (doctor_id, day), doctor_changes in by_doctor.items():
+            channel = doctor_channel(doctor_id, day)
+            waiting, positions = live_queue.doctor_positions(doctor_id, day)
+
+            if hub.has_subscribers(channel):
+                hub.publish(channel, 'queue', {
+                    'doctor_id': doctor_id,
+                    'visit_date': day.isoformat(),
+                    'waiting': waiting,
+                    'changes': [{
+                        'visit_id': change.visit_id,
+                        'queue_number': change.queue_number,
+                        'status': None if change.deleted else change.status,
+                        'previous_status': change.previous_status
+                    } for change in doctor_changes]
+                })
+
+            # Visits that left the queue get a final update with their new status
+            for change in doctor_changes:
+                if change.visit_id not in positions and hub.has_subscribers(visit_channel(change.visit_id)):
+                    status = None if change.deleted else change.status
+                    hub.publish(visit_channel(change.visit_id), 'position',
+                                visit_position(change.visit_id, status, None))
+
+            # Everyone still queued at this doctor may have moved
+            for visit_id, (status, ahead) in positions.items():
+                if hub.has_subscribers(visit_channel(visit_id)):
+                    hub.publish(visit_channel(visit_id), 'position', visit_position(visit_id, status, ahead))
+
+
+hub = EventHub()
+feed = ChangeFeed()
+visit_events.on_commit(feed.publish)
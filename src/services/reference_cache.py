@@ -0,0 +1,105 @@
+import hashlib
+import threading
+import time
+from flask import Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.department import Department
+from src.models.doctor import Doctor
+
+# Other worker processes do not see our invalidations; entries expire after
+# this long so their changes show up within the same bound.
+CACHE_TTL_SECONDS = 30
+
+# Which cached collections a change to each model makes stale. Doctor
+# payloads include the department name, so departments affect both.
+INVALIDATES = {
+    Department: ('departments', 'doctors'),
+    Doctor: ('doctors',),
+}
+
+
+class ReferenceCache:
+    """Serialized JSON bodies of rarely changing collections, with their ETags.
+
+    Each collection has a version that is bumped whenever it changes; an
+    entry built under an older version is never served.
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._entries = {}
+
+    def version(self, collection):
+        return self._versions.get(collection, 0)
+
+    def get(self, collection, key):
+        entry = self._entries.get((collection, key))
+        if entry and entry[0] == self.version(collection) and entry[1] > time.monotonic():
+            return entry[2], entry[3]
+        return None
+
+    def put(self, collection, key, version, etag, body):
+        with self._lock:
+            # Skip if the collection changed while the body was being built
+            if version == self.version(collection):
+                self._entries[(collection, key)] = (version, time.monotonic() + self.ttl, etag, body)
+
+    def invalidate(self, collection):
+        with self._lock:
+            self._versions[collection] = self.version(collection) + 1
+            self._entries = {k: v for k, v in self._entries.items() if k[0] != collection}
+
+
+reference_cache = ReferenceCache()
+
+
+def cached_json(collection, key, build):
+    """JSON response for a cached reference payload, honouring If-None-Match.
+
+    ``build`` returns the payload and only runs on a cache miss; if it
+    returns None nothing is cached and None is returned. A client holding
+    the current ETag gets 304 without the payload being loaded or
+    serialized.
+    """
+    cached = reference_cache.get(collection, key)
+    if cached is None:
+        version = reference_cache.version(collection)
+        payload = build()
+        if payload is None:
+            return None
+        body = current_app.json.response(payload).get_data()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        reference_cache.put(collection, key, version, etag, body)
+    else:
+        etag, body = cached
+
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+_PENDING_KEY = 'stale_reference_collections'
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stale_collections(session, flush_context):
+    stale = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        stale.update(INVALIDATES.get(type(obj), ()))
+    if stale:
+        session.info.setdefault(_PENDING_KEY, set()).update(stale)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stale_collections(session):
+    for collection in session.info.pop(_PENDING_KEY, ()):
+        reference_cache.invalidate(collection)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_collections(session):
+    session.info.pop(_PENDING_KEY, None)
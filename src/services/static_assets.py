@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from datetime import datetime, timezone
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional; .br files shipped with the build are still served
+    brotli = None
+
+# Files under this prefix have a content hash in their name and never change
+IMMUTABLE_PREFIX = 'assets/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'image/x-icon', 'image/vnd.microsoft.icon')
+MIN_COMPRESS_SIZE = 512
+
+# Content-Encoding -> file suffix of a variant produced by the frontend build
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class Asset:
+    """One static file held in memory with its compressed variants"""
+    __slots__ = ('path', 'mimetype', 'etag', 'last_modified', 'cache_control', 'variants')
+
+    def __init__(self, path, body, mimetype, last_modified):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = last_modified
+        immutable = path.startswith(IMMUTABLE_PREFIX)
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        self.variants = {None: body}   # Content-Encoding -> bytes
+
+
+class AssetManifest:
+    """Every file of the static folder, read and compressed once.
+
+    Requests are answered from memory: no stat or open per request, the
+    smallest encoding the client accepts, and ETag/Last-Modified
+    validation. Files added after build() are not seen until the next
+    build (a restart).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.assets = {}
+
+    def build(self, root):
+        assets = {}
+        for directory, _, files in os.walk(root):
+            for name in files:
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, root).replace(os.sep, '/')
+                if any(path.endswith(suffix) for suffix in ENCODING_SUFFIXES.values()):
+                    continue
+                assets[path] = _load(full_path, path)
+        self.root = root
+        self.assets = assets
+        return self
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def response(self, asset):
+        """Response for ``asset`` honouring Accept-Encoding and conditional headers"""
+        encoding = _choose_encoding(asset)
+        body = asset.variants[encoding]
+        response = Response(body, mimetype=asset.mimetype)
+        response.set_etag(asset.etag if encoding is None else f'{asset.etag}-{encoding}')
+        response.last_modified = asset.last_modified
+        response.headers['Cache-Control'] = asset.cache_control
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response.make_conditional(request)
+
+
+def _load(full_path, path):
+    with open(full_path, 'rb') as handle:
+        body = handle.read()
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    last_modified = datetime.fromtimestamp(int(os.path.getmtime(full_path)), timezone.utc)
+    asset = Asset(path, body, mimetype, last_modified)
+    if len(body) < MIN_COMPRESS_SIZE or not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return asset
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if os.path.exists(full_path + suffix):
+            with open(full_path + suffix, 'rb') as handle:
+                asset.variants[encoding] = handle.read()
+    if 'gzip' not in asset.variants:
+        asset.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    if 'br' not in asset.variants and brotli is not None:
+        asset.variants['br'] = brotli.compress(body, quality=11)
+
+    # Only keep variants that are actually smaller
+    for encoding in [encoding for encoding in asset.variants if encoding is not None]:
+        if len(asset.variants[encoding]) >= len(body):
+            del asset.variants[encoding]
+    return asset
+
+
+def _choose_encoding(asset):
+    accepted = request.accept_encodings
+    candidates = [encoding for encoding in asset.variants if encoding is not None and accepted[encoding] > 0]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda encoding: len(asset.variants[encoding]))
+
+
+manifest = AssetManifest()
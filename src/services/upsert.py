@@ -0,0 +1,11 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def upsert(session, model):
+    """INSERT statement for ``model`` supporting on_conflict_do_update on the session's database"""
+    return _INSERTS[session.get_bind().dialect.name](model)
@@ -0,0 +1,103 @@
+import logging
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.visit import Visit
+
+logger = logging.getLogger(__name__)
+
+# Snapshot of a visit taken when it is flushed. previous_* hold the values
+# before this change; created marks new visits (previous_* are then None).
+VisitChange = namedtuple('VisitChange', [
+    'visit_id', 'patient_id', 'doctor_id', 'visit_date', 'queue_number', 'created_at',
+    'status', 'rating', 'completed_at',
+    'previous_status', 'previous_rating', 'previous_completed_at',
+    'created', 'deleted'
+])
+
+_PENDING_KEY = 'visit_changes'
+_flush_listeners = []
+_commit_listeners = []
+
+
+def on_flush(listener):
+    """Register ``listener(session, changes)`` to run inside the transaction that changes visits"""
+    _flush_listeners.append(listener)
+    return listener
+
+
+def on_commit(listener):
+    """Register ``listener(changes)`` to run after a transaction that changed visits commits"""
+    _commit_listeners.append(listener)
+    return listener
+
+
+def record(session, changes):
+    """Report visit changes to the listeners.
+
+    Called automatically for ORM flushes; code that changes visits with Core
+    statements (which bypass the flush hooks) must call it itself, in the
+    same transaction.
+    """
+    for listener in _flush_listeners:
+        listener(session, changes)
+    session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+def snapshot(visit, created=False, deleted=False, previous=None):
+    """VisitChange for a visit object; ``previous`` maps attribute names to their old values"""
+    previous = previous or {}
+    if created:
+        before = (None, None, None)
+    else:
+        before = tuple(previous.get(name, getattr(visit, name)) for name in ('status', 'rating', 'completed_at'))
+    return VisitChange(
+        visit.id, visit.patient_id, visit.doctor_id, visit.visit_date, visit.queue_number, visit.created_at,
+        visit.status, visit.rating, visit.completed_at,
+        *before, created, deleted
+    )
+
+
+def _previous_values(visit):
+    state = inspect(visit)
+    previous = {}
+    for name in ('status', 'rating', 'completed_at'):
+        history = state.attrs[name].history
+        if history.deleted:
+            previous[name] = history.deleted[0]
+    return previous
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Visit):
+            changes.append(snapshot(obj, created=True))
+    for obj in session.dirty:
+        if isinstance(obj, Visit) and session.is_modified(obj):
+            changes.append(snapshot(obj, previous=_previous_values(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, Visit):
+            changes.append(snapshot(obj, deleted=True))
+    if changes:
+        record(session, changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    for listener in _commit_listeners:
+        try:
+            listener(changes)
+        except Exception:
+            # The transaction is already durable; a failing listener must not
+            # turn a successful request into an error.
+            logger.exception('Visit change listener %r failed', listener)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,330 @@
+import itertools
+import threading
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import Integer, cast, extract, func, select, union_all
+from src.models.user import db
+from src.models.visit import Visit
+from src.models.visit_archive import VisitArchive
+from src.services import visit_events
+
+# Used until a doctor has any history
+DEFAULT_MINUTES_PER_PATIENT = 15.0
+
+# A (doctor, weekday, hour) bucket needs this many observed gaps to be used;
+# otherwise the prediction falls back to (doctor, hour), then the doctor,
+# then every doctor.
+MIN_SAMPLES = 5
+
+# Gaps between two completions longer than this are breaks, not service
+MAX_GAP_SECONDS = 2 * 3600
+
+# Weight of the newest gap in today's moving average, and how many of
+# today's gaps it takes for the average to count as much as the history.
+EWMA_ALPHA = 0.3
+EWMA_CONFIDENCE = 3
+
+# Today's averages are recomputed from the visit table once they are older
+# than this, so every worker process sees the completions of all of them.
+TODAY_MAX_AGE_SECONDS = 30
+
+
+def epoch_seconds(column):
+    """SQL expression for a naive UTC DateTime column as integer seconds since 1970"""
+    if db.engine.dialect.name == 'sqlite':
+        return cast(func.strftime('%s', column), Integer)
+    return cast(extract('epoch', column), Integer)
+
+
+def completion_extract(before=None, since=None):
+    """Columnar extract of completed visits, live and archived.
+
+    Returns (doctor_id, created, completed) NumPy arrays, ordered by doctor
+    and completion time, with times in seconds since 1970 (UTC).
+    """
+    selects = []
+    for model in (Visit, VisitArchive):
+        query = select(
+            model.doctor_id, epoch_seconds(model.created_at), epoch_seconds(model.completed_at)
+        ).where(model.status == 'completed', model.completed_at.isnot(None), model.created_at.isnot(None))
+        if before is not None:
+            query = query.where(model.visit_date < before)
+        if since is not None:
+            query = query.where(model.visit_date >= since)
+        selects.append(query)
+
+    rows = db.session.execute(union_all(*selects)).all()
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # fromiter over the flattened rows is far faster than np.array(rows)
+    data = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=3 * len(rows)).reshape(-1, 3)
+    doctors, created, completed = data[:, 0], data[:, 1], data[:, 2]
+    order = np.lexsort((completed, doctors))
+    return doctors[order], created[order], completed[order]
+
+
+def completion_gaps(doctors, completed):
+    """Seconds between consecutive completions of the same doctor on the same day.
+
+    Inputs are ordered by doctor and completion time; returns the doctor,
+    completion time and gap of every valid pair.
+    """
+    gaps = np.diff(completed)
+    same_day = (doctors[1:] == doctors[:-1]) & (completed[1:] // 86400 == completed[:-1] // 86400)
+    valid = same_day & (gaps > 0) & (gaps <= MAX_GAP_SECONDS)
+    return doctors[1:][valid], completed[1:][valid], gaps[valid]
+
+
+def _group_medians(keys, values):
+    """Median and count of ``values`` per distinct key, vectorized"""
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    unique, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    medians = (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2
+    return unique, medians, counts
+
+
+def _weekday_hour(seconds):
+    days = seconds // 86400
+    # 1970-01-01 was a Thursday; Monday is 0 like datetime.weekday()
+    return (days + 3) % 7, (seconds % 86400) // 3600
+
+
+class WaitTimeModel:
+    """Predicts the minutes each patient ahead in a queue adds to the wait.
+
+    The history gives the typical gap between two completions per doctor,
+    weekday and hour (UTC); an exponentially weighted average of today's
+    gaps pulls the estimate towards the doctor's current pace. Today's
+    averages are folded from the completions stored in the database, not
+    from this process's commits, which under a multi-worker server are
+    only some of them; they are reloaded every TODAY_MAX_AGE_SECONDS and
+    after a completion committed here. Predictions are dictionary lookups.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.trained_at = None
+        self.by_weekday_hour = {}   # (doctor_id, weekday, hour) -> minutes
+        self.by_hour = {}           # (doctor_id, hour) -> minutes
+        self.by_doctor = {}         # doctor_id -> minutes
+        self.overall = DEFAULT_MINUTES_PER_PATIENT
+        self.today = {}             # (doctor_id, day) -> [last completion seconds, ewma minutes, gaps seen]
+        self.today_loaded_at = None
+        self._refreshing = False
+
+    def fit(self, doctors, completed):
+        """Learn the historical pace from a completion_extract()"""
+        gap_doctors, gap_times, gaps = completion_gaps(doctors, completed)
+        minutes = gaps / 60.0
+        weekdays, hours = _weekday_hour(gap_times)
+
+        tables = []
+        for keys in ((gap_doctors * 7 + weekdays) * 24 + hours, gap_doctors * 24 + hours, gap_doctors):
+            unique, medians, counts = _group_medians(keys, minutes) if len(keys) else ([], [], [])
+            tables.append({
+                int(key): float(median) for key, median, count in zip(unique, medians, counts) if count >= MIN_SAMPLES
+            })
+
+        by_weekday_hour = {(key // 168, key // 24 % 7, key % 24): value for key, value in tables[0].items()}
+        by_hour = {(key // 24, key % 24): value for key, value in tables[1].items()}
+        overall = float(np.median(minutes)) if len(minutes) >= MIN_SAMPLES else DEFAULT_MINUTES_PER_PATIENT
+        with self._lock:
+            self.by_weekday_hour = by_weekday_hour
+            self.by_hour = by_hour
+            self.by_doctor = tables[2]
+            self.overall = overall
+            self.trained_at = datetime.utcnow()
+        return len(gaps)
+
+    def train(self):
+        """Fit on all history and load today's averages"""
+        doctors, _, completed = completion_extract(before=date.today())
+        count = self.fit(doctors, completed)
+        self.refresh_today()
+        return count
+
+    def refresh_today(self):
+        """Recompute today's averages from today's completions in the database"""
+        rows = db.session.execute(
+            select(Visit.doctor_id, epoch_seconds(Visit.completed_at))
+            .where(Visit.visit_date == date.today(), Visit.status == 'completed', Visit.completed_at.isnot(None))
+            .order_by(Visit.doctor_id, Visit.completed_at)
+        ).all()
+        today = {}
+        for doctor_id, seconds in rows:
+            _fold(today, doctor_id, seconds)
+        with self._lock:
+            self.today = today
+            self.today_loaded_at = time.monotonic()
+
+    def _ensure_today_fresh(self):
+        loaded_at = self.today_loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at <= TODAY_MAX_AGE_SECONDS:
+            return
+        with self._lock:
+            if self._refreshing:
+                # Another request is already reloading; answer from current state
+                return
+            self._refreshing = True
+        try:
+            self.refresh_today()
+        finally:
+            self._refreshing = False
+
+    def ensure_trained(self):
+        if self.trained_at is None:
+            self.train()
+
+    def historical_minutes(self, doctor_id, weekday, hour):
+        value = self.by_weekday_hour.get((doctor_id, weekday, hour))
+        if value is None:
+            value = self.by_hour.get((doctor_id, hour))
+        if value is None:
+            value = self.by_doctor.get(doctor_id, self.overall)
+        return value
+
+    def minutes_per_patient(self, doctor_id, at=None):
+        """Expected minutes per patient ahead at the doctor, at ``at`` (UTC seconds, default now)"""
+        if at is None:
+            self._ensure_today_fresh()
+            at = _utc_seconds(datetime.utcnow())
+        weekday, hour = _weekday_hour(at)
+        historical = self.historical_minutes(doctor_id, weekday, hour)
+        state = self.today.get((doctor_id, at // 86400))
+        if not state or not state[2]:
+            return historical
+        weight = state[2] / (state[2] + EWMA_CONFIDENCE)
+        return weight * state[1] + (1 - weight) * historical
+
+    def estimate_minutes(self, doctor_id, ahead, at=None):
+        """Minutes until a patient with ``ahead`` waiting visits before them is called"""
+        if not ahead:
+            return 0
+        return round(ahead * self.minutes_per_patient(doctor_id, at))
+
+    def observe_completion(self, doctor_id, seconds):
+        """Fold a completion (UTC seconds) into the doctor's average for that day.
+
+        Completions must be observed in time order, all of them: the gap is
+        measured from the previous one.
+        """
+        with self._lock:
+            _fold(self.today, doctor_id, seconds)
+
+    def apply_changes(self, changes):
+        # Reload today's averages on the next prediction after a completion
+        # committed here; other workers' completions are picked up by age
+        if any(change.status == 'completed' and change.previous_status != 'completed' for change in changes):
+            self.today_loaded_at = None
+
+
+def _fold(today, doctor_id, seconds):
+    """Fold one completion into a {(doctor_id, day): state} table of today's averages"""
+    key = (doctor_id, seconds // 86400)
+    state = today.get(key)
+    if state is None:
+        for old in [k for k in today if k[1] < key[1] - 1]:
+            del today[old]
+        today[key] = [seconds, None, 0]
+        return
+    gap = seconds - state[0]
+    state[0] = max(state[0], seconds)
+    if not 0 < gap <= MAX_GAP_SECONDS:
+        return
+    minutes = gap / 60.0
+    state[1] = minutes if state[1] is None else EWMA_ALPHA * minutes + (1 - EWMA_ALPHA) * state[1]
+    state[2] += 1
+
+
+def _utc_seconds(value):
+    """Naive UTC datetime as integer seconds since 1970"""
+    return int((value - datetime(1970, 1, 1)).total_seconds())
+
+
+def backtest(days=28):
+    """Replay the last ``days`` days against a model trained on the history before them.
+
+    Each completed visit is predicted at its check-in from how many visits
+    of the same doctor were still open, (ahead + 1) x minutes per patient,
+    and compared with its actual check-in to completion time. Returns
+    {predictor: {'visits', 'mae', 'median_ae', 'p90_ae', 'bias'}} in
+    minutes, for the model with and without today's average and for the
+    fixed 15 minutes.
+    """
+    cutoff = date.today() - timedelta(days=days)
+    model = WaitTimeModel()
+    doctors, _, completed = completion_extract(before=cutoff)
+    model.fit(doctors, completed)
+
+    doctors, created, completed = completion_extract(since=cutoff)
+    if not len(doctors):
+        return {}
+    ahead = _open_ahead(doctors, created, completed)
+    actual = (completed - created) / 60.0
+
+    # Replay check-ins and completions in time order so today's average
+    # only ever sees completions that happened before the prediction.
+    times = np.concatenate([created, completed])
+    kinds = np.concatenate([np.zeros(len(created), dtype=np.int8), np.ones(len(completed), dtype=np.int8)])
+    index = np.concatenate([np.arange(len(created)), np.arange(len(completed))])
+    order = np.lexsort((-kinds, times))   # completions first at equal times
+
+    with_today = np.empty(len(created))
+    history_only = np.empty(len(created))
+    doctor_list, time_list = doctors.tolist(), times.tolist()
+    for position in order.tolist():
+        i = index[position]
+        doctor_id = doctor_list[i]
+        if kinds[position]:
+            model.observe_completion(doctor_id, time_list[position])
+            continue
+        at = time_list[position]
+        with_today[i] = model.minutes_per_patient(doctor_id, at)
+        weekday, hour = _weekday_hour(at)
+        history_only[i] = model.historical_minutes(doctor_id, weekday, hour)
+
+    results = {}
+    for name, pace in (('model', with_today), ('history only', history_only),
+                       ('fixed 15 min', np.full(len(created), DEFAULT_MINUTES_PER_PATIENT))):
+        errors = (ahead + 1) * pace - actual
+        results[name] = {
+            'visits': int(len(errors)),
+            'mae': float(np.mean(np.abs(errors))),
+            'median_ae': float(np.median(np.abs(errors))),
+            'p90_ae': float(np.percentile(np.abs(errors), 90)),
+            'bias': float(np.mean(errors)),
+        }
+    return results
+
+
+def _open_ahead(doctors, created, completed):
+    """For each visit, how many visits of the same doctor and day were checked in before it and not yet done.
+
+    A visit that completed before another was checked in was necessarily
+    checked in before it too, so ahead = earlier check-ins - earlier
+    completions, counted with two sorted searches per doctor-day.
+    """
+    # Give every doctor-day its own stretch of one time axis so a single
+    # sorted array per event kind answers "how many before t in my group".
+    _, group = np.unique(np.stack([doctors, created // 86400]), axis=1, return_inverse=True)
+    group = group.ravel()
+    base = min(created.min(), completed.min())
+    span = int(max(created.max(), completed.max()) - base) + 1
+    group_start = group * span
+    check_in_keys = group_start + (created - base)
+    completion_keys = group_start + (completed - base)
+    sorted_check_ins = np.sort(check_in_keys)
+    sorted_completions = np.sort(completion_keys)
+
+    earlier_check_ins = (np.searchsorted(sorted_check_ins, check_in_keys, side='left')
+                         - np.searchsorted(sorted_check_ins, group_start, side='left'))
+    earlier_completions = (np.searchsorted(sorted_completions, check_in_keys, side='right')
+                           - np.searchsorted(sorted_completions, group_start, side='left'))
+    return np.maximum(earlier_check_ins - earlier_completions, 0)
+
+
+wait_time_model = WaitTimeModel()
+visit_events.on_commit(wait_time_model.apply_changes)